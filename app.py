@@ -1,26 +1,642 @@
 import os, re, pytz, datetime as dt
 import gspread
 import json
+import sqlite3
 import unicodedata as ud
-import time, random, threading
+import time, random, threading, atexit, signal, sys, bisect, uuid, functools
+import numpy as np
 from dotenv import load_dotenv
-from slack_bolt import App
+from slack_bolt import App, BoltResponse
 from slack_bolt.adapter.socket_mode import SocketModeHandler
+from slack_sdk.errors import SlackApiError
 from google.oauth2.service_account import Credentials
 from typing import Callable
+from types import MappingProxyType
+from array import array
+from enum import IntEnum
+from concurrent.futures import Future, ThreadPoolExecutor, wait as futures_wait
 from datetime import timedelta
-from gspread.exceptions import APIError
+from collections import Counter, OrderedDict, deque
+from gspread.exceptions import APIError, WorksheetNotFound
+from contextlib import contextmanager
+import requests
+import google.auth.exceptions
 
 load_dotenv()
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-creds = Credentials.from_service_account_file("service_account.json", scopes=SCOPES)
-gc = gspread.authorize(creds)
-sh = gc.open_by_key(os.environ["SHEET_ID"])
-logs = sh.worksheet("logs")
-app = App(token=os.environ["SLACK_BOT_TOKEN"])
+
+# =========================================================
+# 저장소 백엔드
+# ---------------------------------------------------------
+# STORAGE_BACKEND=gspread(기본) | memory
+# 앱이 쓰는 워크시트 인터페이스: title, get_all_values, get, batch_get,
+#   append_row(s), update, batch_update
+# 스프레드시트 인터페이스: worksheet, worksheets, add_worksheet, values_batch_get
+# memory는 같은 동작을 프로세스 메모리에서 흉내 내고 호출마다 MEMORY_LATENCY_MS 지연을 넣는다.
+# 두 백엔드의 모든 호출은 sheets_call을 거치며 API_CALLS에 (op, sheet)별로 집계된다.
+# sheets_call은 읽기/쓰기 쿼터별 토큰 버킷을 먼저 통과한다 (429를 맞기 전에 속도 조절).
+# =========================================================
+STORAGE_BACKEND = (os.getenv("STORAGE_BACKEND") or "gspread").strip().lower()
+MEMORY_LATENCY_MS = float(os.getenv("MEMORY_LATENCY_MS") or 0)
+MEMORY_SEED_PATH = os.getenv("MEMORY_SEED_PATH") or ""
+
+SHEET_HEADERS = {
+    "logs": ["timestamp","user_key","user_name","type","note","date","source","by_user"],
+    "balances": ["user_key","user_name","annual_total","annual_used","annual_left",
+                 "half_used","override_left","override_from","last_admin_update","notes"],
+    "schedule_weekly": ["week","user_key","Mon","Tue","Wed","Thu","Fri","Sat","Sun"],
+    "holidays": ["date"],
+    "admin_requests": ["ts_iso","admin_key","target_key","action","params_json","status","reason"],
+}
+
+API_CALLS = Counter()  # (op, sheet) -> 호출 수
+_api_calls_lock = threading.Lock()
+
+# --- Sheets 분당 쿼터 (프로젝트 설정값에 맞출 것) ---
+SHEETS_READ_QUOTA_PER_MIN = int(os.getenv("SHEETS_READ_QUOTA_PER_MIN") or 60)
+SHEETS_WRITE_QUOTA_PER_MIN = int(os.getenv("SHEETS_WRITE_QUOTA_PER_MIN") or 60)
+SHEETS_BURST = int(os.getenv("SHEETS_BURST") or 10)
+SHEETS_WRITE_OPS = {"append_rows", "update", "batch_update", "add_worksheet"}
+# 쿼터 대기 상한. 요청 기한(request_deadline) 안이면 남은 시간이 더 짧은 쪽
+SHEETS_MAX_WAIT_SEC = float(os.getenv("SHEETS_MAX_WAIT_SEC") or 30)
+
+# 스레드별 상태: 요청 기한(request_deadline), 재시도 루프 진행 여부(RetryPolicy)
+_retry_local = threading.local()
+
+class TokenBucket:
+    """프로세스 전역 토큰 버킷 (GCRA). 도착 순서대로 다음 빈 슬롯을 예약하므로 공정하다."""
+
+    def __init__(self, per_min: int, burst: int):
+        self.interval = 60.0 / max(1, per_min)
+        self.tolerance = self.interval * max(0, burst - 1)
+        self._tat = time.monotonic()  # 다음 토큰의 이론적 도착 시각
+        self._lock = threading.Lock()
+
+    def _delay(self, now: float) -> float:
+        return max(0.0, max(self._tat, now) - self.tolerance - now)
+
+    def acquire(self, max_wait: float | None = None) -> float | None:
+        """
+        토큰 1개를 예약하고 차례가 올 때까지 대기. 대기한 초를 반환.
+        max_wait보다 오래 기다려야 하면 예약하지 않고 None (뒤 차례를 밀어내지 않는다).
+        """
+        with self._lock:
+            now = time.monotonic()
+            delay = self._delay(now)
+            if max_wait is not None and delay > max_wait:
+                return None
+            self._tat = max(self._tat, now) + self.interval
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    def wait_time(self) -> float:
+        """지금 호출하면 기다려야 하는 초."""
+        with self._lock:
+            return self._delay(time.monotonic())
+
+SHEETS_READ_BUCKET = TokenBucket(SHEETS_READ_QUOTA_PER_MIN, SHEETS_BURST)
+SHEETS_WRITE_BUCKET = TokenBucket(SHEETS_WRITE_QUOTA_PER_MIN, SHEETS_BURST)
+
+# --- 현재 쿼터 대기 시간 ---
+def sheets_wait_time() -> dict:
+    return {"read": SHEETS_READ_BUCKET.wait_time(), "write": SHEETS_WRITE_BUCKET.wait_time()}
+
+# --- 서킷 브레이커 ---
+# 일시 오류가 BREAKER_FAIL_THRESHOLD번 연속되면 열려서 BREAKER_COOLDOWN_SEC 동안 호출 없이 바로 실패.
+# 쿨다운이 지나면 반열림: 호출 하나만 시험으로 보내고, 성공하면 닫고 실패하면 다시 연다.
+# 장애 중에도 Socket Mode 워커 스레드가 재시도/대기에 묶이지 않게 한다.
+BREAKER_FAIL_THRESHOLD = int(os.getenv("BREAKER_FAIL_THRESHOLD") or 5)
+BREAKER_COOLDOWN_SEC = float(os.getenv("BREAKER_COOLDOWN_SEC") or 30)
+
+class SheetsUnavailable(RuntimeError):
+    """Google Sheets에 접근할 수 없음 (재시도 소진 또는 브레이커 열림)."""
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold: int, cooldown_sec: float):
+        self.threshold = threshold
+        self.cooldown_sec = cooldown_sec
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """호출해도 되면 True. 반열림 상태에서는 시험 호출 하나만 통과."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown_sec:
+                    return False
+                self.state = self.HALF_OPEN
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def cancel_probe(self):
+        """통과시킨 호출을 보내지 않았을 때 (상태 그대로, 다음 호출이 시험하게)."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self._failures >= self.threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def retry_in(self) -> float:
+        """열려 있을 때 다음 시험 호출까지 남은 초."""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.cooldown_sec - (time.monotonic() - self._opened_at))
+
+SHEETS_BREAKER = CircuitBreaker(BREAKER_FAIL_THRESHOLD, BREAKER_COOLDOWN_SEC)
+
+# --- 모든 Sheets 호출의 통로 (브레이커 → 쿼터 대기 → 호출) ---
+def sheets_call(op: str, sheet: str, fn):
+    if not SHEETS_BREAKER.allow():
+        raise SheetsUnavailable("Google Sheets 장애로 지금은 처리할 수 없습니다. 잠시 후 다시 시도해주세요.")
+    bucket = SHEETS_WRITE_BUCKET if op in SHEETS_WRITE_OPS else SHEETS_READ_BUCKET
+    max_wait = SHEETS_MAX_WAIT_SEC
+    req_deadline = getattr(_retry_local, "deadline", None)
+    if req_deadline is not None:
+        max_wait = min(max_wait, req_deadline - time.monotonic())
+    if bucket.acquire(max(0.0, max_wait)) is None:
+        SHEETS_BREAKER.cancel_probe()
+        raise SheetsUnavailable("요청이 많아 지금은 처리할 수 없습니다. 잠시 후 다시 시도해주세요.")
+    with _api_calls_lock:
+        API_CALLS[(op, sheet)] += 1
+    try:
+        result = fn()
+    except Exception as e:
+        if RetryPolicy.classify(e)[0]:
+            SHEETS_BREAKER.record_failure()
+        else:
+            SHEETS_BREAKER.record_success()  # 4xx 등은 서버가 응답한 것
+        raise
+    SHEETS_BREAKER.record_success()
+    return result
+
+# --- 지금까지의 API 호출 수 (명령 전후 차이로 명령당 호출 수 측정) ---
+def api_call_stats() -> dict:
+    with _api_calls_lock:
+        return dict(API_CALLS)
+
+# --- A1 표기 ---
+A1_RANGE_RE = re.compile(r"^(?:.*!)?\$?([A-Z]*)\$?(\d*)(?::\$?([A-Z]*)\$?(\d*))?$")
+
+def col_index(letters: str) -> int:
+    n = 0
+    for ch in letters:
+        n = n * 26 + (ord(ch) - 64)
+    return n - 1
+
+def col_letter(i: int) -> str:
+    s = ""
+    i += 1
+    while i:
+        i, r = divmod(i - 1, 26)
+        s = chr(65 + r) + s
+    return s
+
+# --- A1 범위 -> (r0, c0, r1, c1). 열린 끝은 None ---
+def a1_bounds(a1: str) -> tuple:
+    m = A1_RANGE_RE.match((a1 or "").replace("'", ""))
+    if not m:
+        raise ValueError(f"지원하지 않는 범위: {a1}")
+    c0 = col_index(m.group(1)) if m.group(1) else 0
+    r0 = int(m.group(2)) if m.group(2) else 1
+    if m.group(3) is None and m.group(4) is None:
+        return r0, c0, r0, c0
+    c1 = col_index(m.group(3)) if m.group(3) else None
+    r1 = int(m.group(4)) if m.group(4) else None
+    return r0, c0, r1, c1
+
+def a1_start(a1: str) -> tuple:
+    r0, c0, _, _ = a1_bounds(a1)
+    return r0, c0
+
+# --- 전체 값에서 A1 범위 잘라내기 (Values API처럼 끝 빈 셀/빈 행 생략) ---
+def slice_values(vals: list, a1: str | None) -> list:
+    r0, c0, r1, c1 = a1_bounds(a1) if a1 else (1, 0, None, None)
+    return clip_rows(vals[r0 - 1:(r1 if r1 is not None else len(vals))], c0, c1)
+
+# --- 행 목록에서 열 구간만 남기기 (끝 빈 셀/빈 행 생략) ---
+def clip_rows(rows: list, c0: int, c1: int | None) -> list:
+    out = []
+    for r in rows:
+        r = list(r[c0:(c1 + 1 if c1 is not None else None)])
+        while r and r[-1] == "":
+            r.pop()
+        out.append(r)
+    while out and not out[-1]:
+        out.pop()
+    return out
+
+class MemoryWorksheet:
+    """gspread Worksheet와 같은 방식으로 동작하는 메모리 시트."""
+
+    def __init__(self, title: str, rows: list | None = None, latency: float = 0.0):
+        self.title = title
+        self._rows = [[str(v) for v in r] for r in (rows or [])]
+        self._latency = latency
+        self._lock = threading.Lock()
+
+    @property
+    def row_count(self) -> int:
+        return max(1000, len(self._rows))
+
+    def _call(self, op: str, fn):
+        def run():
+            if self._latency:
+                time.sleep(self._latency * random.uniform(0.5, 1.5))
+            with self._lock:
+                return fn()
+        return sheets_call(op, self.title, run)
+
+    def _padded(self) -> list:
+        width = max((len(r) for r in self._rows), default=0)
+        return [r + [""] * (width - len(r)) for r in self._rows]
+
+    def get_all_values(self, *args, **kwargs):
+        return self._call("get_all_values", self._padded)
+
+    def get(self, range_name=None, *args, **kwargs):
+        return self._call("get", lambda: slice_values(self._padded(), range_name))
+
+    def batch_get(self, ranges, *args, **kwargs):
+        return self._call("batch_get", lambda: [slice_values(self._padded(), a) for a in ranges])
+
+    def append_row(self, values, *args, **kwargs):
+        return self.append_rows([values], *args, **kwargs)
+
+    def append_rows(self, values, *args, **kwargs):
+        def run():
+            # 표의 마지막 비어 있지 않은 행 다음부터
+            last = len(self._rows)
+            while last and not any(str(v) for v in self._rows[last - 1]):
+                last -= 1
+            del self._rows[last:]
+            self._rows.extend([["" if v is None else str(v) for v in r] for r in values])
+            width = max((len(r) for r in values), default=1)
+            rng = f"'{self.title}'!A{last + 1}:{col_letter(width - 1)}{last + len(values)}"
+            return {"updates": {"updatedRange": rng, "updatedRows": len(values)}}
+        return self._call("append_rows", run)
+
+    def _set(self, a1: str, values: list):
+        r0, c0 = a1_start(a1)
+        for i, vals in enumerate(values):
+            rn = r0 + i
+            while len(self._rows) < rn:
+                self._rows.append([])
+            row = self._rows[rn - 1]
+            if len(row) < c0 + len(vals):
+                row += [""] * (c0 + len(vals) - len(row))
+            for j, v in enumerate(vals):
+                row[c0 + j] = "" if v is None else str(v)
+
+    def update(self, range_name=None, values=None, *args, **kwargs):
+        if not isinstance(range_name, str):  # gspread 6 순서 (values, range_name)
+            range_name, values = values, range_name
+        return self._call("update", lambda: self._set(range_name, values))
+
+    def batch_update(self, data, *args, **kwargs):
+        def run():
+            for d in data:
+                self._set(d["range"], d["values"])
+        return self._call("batch_update", run)
+
+class MemorySpreadsheet:
+    def __init__(self, sheets: dict, latency: float = 0.0):
+        self._latency = latency
+        self._sheets = {t: MemoryWorksheet(t, rows, latency) for t, rows in sheets.items()}
+
+    @classmethod
+    def seeded(cls, path: str = "", latency: float = 0.0):
+        """기본 헤더만 있는 시트 5장. path(JSON {sheet: [[...], ...]})가 있으면 그 내용으로."""
+        sheets = {t: [h] for t, h in SHEET_HEADERS.items()}
+        if path:
+            with open(path, encoding="utf-8") as f:
+                sheets.update(json.load(f))
+        return cls(sheets, latency)
+
+    def worksheet(self, name):
+        def run():
+            if name not in self._sheets:
+                raise WorksheetNotFound(name)
+            return self._sheets[name]
+        return sheets_call("worksheet", name, run)
+
+    def worksheets(self, *args, **kwargs):
+        return sheets_call("worksheets", "", lambda: list(self._sheets.values()))
+
+    def add_worksheet(self, title, rows=0, cols=0, *args, **kwargs):
+        def run():
+            ws = self._sheets.setdefault(title, MemoryWorksheet(title, latency=self._latency))
+            return ws
+        return sheets_call("add_worksheet", title, run)
+
+    def values_batch_get(self, ranges, *args, **kwargs):
+        def run():
+            out = []
+            for a in ranges:
+                title, _, rng = a.partition("!")
+                ws = self._sheets[title.strip("'")]
+                vals = ws._padded()
+                out.append({"range": a, "values": slice_values(vals, rng) if rng else vals})
+            return {"valueRanges": out}
+        return sheets_call("values_batch_get", "", run)
+
+class GspreadWorksheet:
+    """gspread Worksheet 감싸기. 앱이 쓰는 호출을 sheets_call로 통과시킨다."""
+
+    def __init__(self, ws):
+        self._ws = ws
+
+    def __getattr__(self, name):
+        return getattr(self._ws, name)
+
+    @property
+    def title(self):
+        return self._ws.title
+
+    def get_all_values(self, *args, **kwargs):
+        return sheets_call("get_all_values", self.title, lambda: self._ws.get_all_values(*args, **kwargs))
+
+    def get(self, *args, **kwargs):
+        return sheets_call("get", self.title, lambda: self._ws.get(*args, **kwargs))
+
+    def batch_get(self, *args, **kwargs):
+        return sheets_call("batch_get", self.title, lambda: self._ws.batch_get(*args, **kwargs))
+
+    def append_row(self, *args, **kwargs):
+        return sheets_call("append_rows", self.title, lambda: self._ws.append_row(*args, **kwargs))
+
+    def append_rows(self, *args, **kwargs):
+        return sheets_call("append_rows", self.title, lambda: self._ws.append_rows(*args, **kwargs))
+
+    def update(self, *args, **kwargs):
+        return sheets_call("update", self.title, lambda: self._ws.update(*args, **kwargs))
+
+    def batch_update(self, *args, **kwargs):
+        return sheets_call("batch_update", self.title, lambda: self._ws.batch_update(*args, **kwargs))
+
+class GspreadSpreadsheet:
+    def __init__(self, sh_):
+        self._sh = sh_
+
+    def __getattr__(self, name):
+        return getattr(self._sh, name)
+
+    def worksheet(self, name):
+        return GspreadWorksheet(sheets_call("worksheet", name, lambda: self._sh.worksheet(name)))
+
+    def worksheets(self, *args, **kwargs):
+        wss = sheets_call("worksheets", "", lambda: self._sh.worksheets(*args, **kwargs))
+        return [GspreadWorksheet(w) for w in wss]
+
+    def add_worksheet(self, *args, **kwargs):
+        return GspreadWorksheet(sheets_call("add_worksheet", "", lambda: self._sh.add_worksheet(*args, **kwargs)))
+
+    def values_batch_get(self, *args, **kwargs):
+        return sheets_call("values_batch_get", "", lambda: self._sh.values_batch_get(*args, **kwargs))
+
+# --- 설정된 백엔드로 스프레드시트 열기 ---
+def open_spreadsheet(kind: str = STORAGE_BACKEND):
+    if kind == "memory":
+        return MemorySpreadsheet.seeded(MEMORY_SEED_PATH, latency=MEMORY_LATENCY_MS / 1000)
+    if kind != "gspread":
+        raise RuntimeError(f"알 수 없는 STORAGE_BACKEND: {kind}")
+    creds = Credentials.from_service_account_file("service_account.json", scopes=SCOPES)
+    return GspreadSpreadsheet(gspread.authorize(creds).open_by_key(os.environ["SHEET_ID"]))
+
+sh = open_spreadsheet()
+# 리스너 본문을 실행하는 스레드 수 상한 (POST_ACK_WORKERS + 레인 대기열 합보다 크게)
+LISTENER_WORKERS = int(os.getenv("LISTENER_WORKERS") or 32)
+# memory 백엔드(오프라인 부하 테스트)에서는 Slack auth.test도 생략
+app = App(token=os.environ["SLACK_BOT_TOKEN"], token_verification_enabled=STORAGE_BACKEND != "memory",
+          listener_executor=ThreadPoolExecutor(max_workers=LISTENER_WORKERS, thread_name_prefix="listener"))
 KST = pytz.timezone("Asia/Seoul")
 
+# =========================================================
+# ack 이후 작업의 우선순위 레인
+# ---------------------------------------------------------
+# 리스너는 ack()까지는 바로 실행되고, 그 뒤 무거운 구간은 POST_ACK_WORKERS개까지만 동시에 돈다.
+# 빈 자리는 PUNCH(출퇴근) → LEAVE(휴가 등록) → ADMIN(조회/관리) 순으로 배정하므로
+# /잔여가 몰려도 /출근이 밀리지 않는다. 레인 대기열이 POST_ACK_QUEUE_MAX를 넘으면 바로 거절.
+# =========================================================
+POST_ACK_WORKERS = int(os.getenv("POST_ACK_WORKERS") or 8)
+POST_ACK_QUEUE_MAX = int(os.getenv("POST_ACK_QUEUE_MAX") or 6)
+BUSY_MSG = "요청이 많습니다. 잠시 후 다시 시도하세요."
+
+class Lane(IntEnum):
+    PUNCH = 0
+    LEAVE = 1
+    ADMIN = 2
+
+class LaneStats:
+    def __init__(self):
+        self.done = self.rejected = 0
+        self.wait_sum = self.run_sum = self.wait_max = 0.0
+        self.recent_waits = deque(maxlen=200)
+
+    def summary(self, depth: int) -> dict:
+        ms = lambda s: round(s * 1000, 1)
+        waits = sorted(self.recent_waits)
+        p95 = waits[int(len(waits) * 0.95)] if len(waits) >= 20 else (waits[-1] if waits else 0.0)
+        return {"depth": depth, "done": self.done, "rejected": self.rejected,
+                "wait_avg_ms": ms(self.wait_sum / self.done) if self.done else 0.0,
+                "wait_p95_ms": ms(p95), "wait_max_ms": ms(self.wait_max),
+                "run_avg_ms": ms(self.run_sum / self.done) if self.done else 0.0}
+
+class PostAckPool:
+    def __init__(self, workers: int, queue_max: int):
+        self.workers, self.queue_max = workers, queue_max
+        self._cond = threading.Condition()
+        self._running = 0
+        self._waiting = {lane: deque() for lane in Lane}
+        self._reserved = {lane: 0 for lane in Lane}  # 예약했지만 아직 enter 전
+        self._stats = {lane: LaneStats() for lane in Lane}
+
+    def _next_ticket(self):
+        for lane in Lane:
+            if self._waiting[lane]:
+                return self._waiting[lane][0]
+        return None
+
+    def try_reserve(self, lane: Lane) -> bool:
+        """
+        자리를 원자적으로 예약 (enter 또는 release로 반납). 빈 실행 자리를 넘는 몫이
+        lane 대기열(queue_max)을 채웠으면 거절 수만 올리고 False.
+        """
+        with self._cond:
+            mine = len(self._waiting[lane]) + self._reserved[lane]
+            others = sum(len(self._waiting[l]) + self._reserved[l] for l in Lane if l != lane)
+            free = max(0, self.workers - self._running - others)
+            if mine - free < self.queue_max:
+                self._reserved[lane] += 1
+                return True
+            self._stats[lane].rejected += 1
+            return False
+
+    def release(self, lane: Lane):
+        """예약만 하고 enter하지 않은 경우 (오류 ack, ack 전 예외)."""
+        with self._cond:
+            self._reserved[lane] -= 1
+
+    def enter(self, lane: Lane) -> float:
+        """예약을 대기열 자리로 바꾸고 실행 자리가 날 때까지 대기. 기다린 초를 반환."""
+        t0 = time.monotonic()
+        ticket = object()
+        with self._cond:
+            self._reserved[lane] -= 1
+            self._waiting[lane].append(ticket)
+            while self._running >= self.workers or self._next_ticket() is not ticket:
+                self._cond.wait()
+            self._waiting[lane].popleft()
+            self._running += 1
+        return time.monotonic() - t0
+
+    def leave(self, lane: Lane, waited: float, ran: float):
+        with self._cond:
+            self._running -= 1
+            st = self._stats[lane]
+            st.done += 1
+            st.wait_sum += waited
+            st.run_sum += ran
+            st.wait_max = max(st.wait_max, waited)
+            st.recent_waits.append(waited)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {lane.name.lower(): self._stats[lane].summary(len(self._waiting[lane]) + self._reserved[lane])
+                    for lane in Lane}
+
+POST_ACK = PostAckPool(POST_ACK_WORKERS, POST_ACK_QUEUE_MAX)
+
+# --- 레인별 대기/실행 통계 ---
+def post_ack_stats() -> dict:
+    return POST_ACK.stats()
+
+# --- 혼잡 시 거절 응답 (슬래시 커맨드는 메시지, 모달은 첫 입력 블록에 오류 표시) ---
+def _ack_busy(ack, body):
+    if body.get("command"):
+        return ack(text=BUSY_MSG)
+    blocks = ((body.get("view") or {}).get("blocks") or [])
+    bid = next((b.get("block_id") for b in blocks if b.get("type") == "input" and b.get("block_id")), None)
+    if bid:
+        return ack(response_action="errors", errors={bid: BUSY_MSG})
+    ack()
+
+# --- 리스너 데코레이터: ack() 이후 구간을 lane 우선순위로 실행 ---
+# @app.command 아래에 붙인다. 자리는 ack 전에 예약하고, 오류 ack(response_action="errors")면 반납한다.
+# ack가 없는 리스너(메시지 이벤트)는 시작부터 자리를 잡는다.
+def post_ack(lane: Lane):
+    def deco(fn):
+        @functools.wraps(fn)
+        def _w(**kwargs):
+            slot = []  # [기다린 초, 시작 시각]
+
+            def _enter():
+                if not slot:
+                    waited = POST_ACK.enter(lane)
+                    slot.extend((waited, time.monotonic()))
+
+            if not POST_ACK.try_reserve(lane):
+                if "ack" in kwargs:
+                    _ack_busy(kwargs["ack"], kwargs.get("body") or {})
+                return None
+            if "ack" in kwargs:
+                ack = kwargs["ack"]
+
+                def _ack(*a, **k):
+                    ack(*a, **k)
+                    if k.get("response_action") != "errors":
+                        _enter()
+                kwargs["ack"] = _ack
+            else:
+                _enter()
+            try:
+                return fn(**kwargs)
+            finally:
+                if slot:
+                    POST_ACK.leave(lane, slot[0], time.monotonic() - slot[1])
+                else:
+                    POST_ACK.release(lane)
+        return _w
+    return deco
+
+# =========================================================
+# Slack 재전송 중복 제거
+# ---------------------------------------------------------
+# ack가 늦으면 Slack이 같은 이벤트/페이로드를 다시 보낸다. 전역 미들웨어에서
+# 재전달에만 같은 값이 오는 식별자(event_id / trigger_id)를 일정 시간 기억해 두고,
+# 이미 본 요청이면 리스너(시트 I/O) 전에 빈 200으로 끝낸다.
+# 모달 제출도 제출마다 trigger_id가 새로 나온다. 입력값으로 거르면 혼잡 거절이나 폼 오류 뒤
+# 같은 값으로 다시 제출한 것이 빈 200(모달 닫힘)으로 사라지므로 입력값은 보지 않는다.
+# =========================================================
+SLACK_EVENT_DEDUP_SEC = 600  # Events API 재시도는 수 분에 걸쳐 온다
+
+class TTLSet:
+    """최근 본 키를 기억 (최대 max_size개, 오래된 것부터 버림)."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._seen = OrderedDict()  # key -> 만료 시각
+        self._lock = threading.Lock()
+
+    def add(self, key: str, ttl_sec: float) -> bool:
+        """처음(또는 만료 후) 본 키면 True, ttl 안에 이미 본 키면 False."""
+        now = time.monotonic()
+        with self._lock:
+            exp = self._seen.get(key)
+            if exp is not None and exp > now:
+                return False
+            self._seen[key] = now + ttl_sec
+            self._seen.move_to_end(key)
+            while len(self._seen) > self.max_size or (self._seen and next(iter(self._seen.values())) <= now):
+                self._seen.popitem(last=False)
+            return True
+
+    def discard(self, key: str):
+        """처리에 실패한 키를 잊는다 (재시도가 중복으로 걸리지 않게)."""
+        with self._lock:
+            self._seen.pop(key, None)
+
+SLACK_SEEN = TTLSet(20000)
+
+# --- 요청의 중복 판별 키 (없으면 None) ---
+def slack_dedup_key(body: dict) -> tuple:
+    if body.get("event_id"):
+        return "ev:" + body["event_id"], SLACK_EVENT_DEDUP_SEC
+    if body.get("trigger_id"):
+        return "tr:" + body["trigger_id"], SLACK_EVENT_DEDUP_SEC
+    return None, 0
+
+@app.middleware
+def drop_slack_redelivery(body, next, logger):
+    key, ttl = slack_dedup_key(body)
+    if key is not None and not SLACK_SEEN.add(key, ttl):
+        logger.debug(f"duplicate delivery dropped: {key}")
+        return BoltResponse(status=200, body="")
+    return next()
+
 DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$") # YYYY-MM-DD
 
 ISO_WEEK_RE = re.compile(r"^\d{4}-W\d{2}$") # YYYY-Www
@@ -33,10 +649,6 @@ DOW_COLS = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
 RETRY_MAX = 6
 RETRY_BASE = 0.4  # seconds
 
-# 캐시
-user_cache = {}
-user_email_cache = {}
-
 ADMIN_ID_SET = {s.strip() for s in (os.getenv("ADMIN_IDS") or "").split(",") if s.strip()} # Slack 사용자 ID 화이트리스트
 ADMIN_EMAIL_SET = {e.strip().lower() for e in (os.getenv("ADMIN_EMAILS") or "").split(",") if e.strip()} # 이메일 화이트리스트
 
@@ -54,8 +666,7 @@ REQUIRED_SHEETS = ("logs", "balances", "schedule_weekly", "holidays")
 
 def sheet_exists(name: str) -> bool:
     try:
-        get_ws(name)
-        return True
+        return name in WS_REGISTRY.titles()
     except Exception:
         return False
 
@@ -98,6 +709,130 @@ def normalize_action(v: str | None) -> str | None:
     }
     return mapping.get(s)
 
+# =========================================================
+# Slack 사용자 프로필 캐시
+# ---------------------------------------------------------
+# users_info 결과를 USER_CACHE_TTL_SEC 동안 보관 (최대 USER_CACHE_MAX명, LRU).
+# 없는 사용자는 USER_CACHE_NEG_TTL_SEC 동안 None으로 기억(negative cache).
+# 같은 사용자의 동시 조회는 한 번만 호출하고, ratelimited면 Retry-After 동안 호출을 멈추고
+# 만료된 값이라도 있으면 그대로 쓴다.
+# =========================================================
+USER_CACHE_TTL_SEC = int(os.getenv("USER_CACHE_TTL_SEC") or 3600)
+USER_CACHE_NEG_TTL_SEC = int(os.getenv("USER_CACHE_NEG_TTL_SEC") or 300)
+USER_CACHE_MAX = int(os.getenv("USER_CACHE_MAX") or 5000)
+
+# --- users_info/users_list의 user 객체 → 필요한 필드만 ---
+def profile_of(user: dict) -> dict:
+    p = user.get("profile") or {}
+    return {"email": p.get("email") or "", "display_name": p.get("display_name") or "",
+            "real_name": p.get("real_name") or user.get("real_name") or ""}
+
+class ProfileCache:
+    def __init__(self, ttl_sec: int, neg_ttl_sec: int, max_size: int):
+        self.ttl_sec, self.neg_ttl_sec, self.max_size = ttl_sec, neg_ttl_sec, max_size
+        self._data = OrderedDict()  # user_id -> (profile | None, expires_at)
+        self._loading = {}          # user_id -> Event (조회 중)
+        self._blocked_until = 0.0   # ratelimited 대기 끝 시각
+        self._lock = threading.Lock()
+
+    def put(self, user_id: str, profile: dict | None):
+        ttl = self.ttl_sec if profile is not None else self.neg_ttl_sec
+        with self._lock:
+            self._data[user_id] = (profile, time.monotonic() + ttl)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._data.pop(user_id, None)
+
+    def get(self, client, user_id: str) -> dict | None:
+        """프로필(dict) 또는 None. 캐시에 없을 때만 users_info 한 번."""
+        while True:
+            with self._lock:
+                hit = self._data.get(user_id)
+                now = time.monotonic()
+                if hit is not None and hit[1] > now:
+                    self._data.move_to_end(user_id)
+                    return hit[0]
+                if client is None or now < self._blocked_until:
+                    return hit[0] if hit else None  # 만료된 값이라도
+                ev = self._loading.get(user_id)
+                if ev is None:
+                    ev = self._loading[user_id] = threading.Event()
+                    break
+            ev.wait(10)  # 다른 스레드가 조회 중 → 결과 대기 후 다시 확인
+            with self._lock:
+                if self._loading.get(user_id) is ev:
+                    return hit[0] if hit else None
+        try:
+            profile = profile_of(client.users_info(user=user_id)["user"])
+            self.put(user_id, profile)
+            return profile
+        except SlackApiError as e:
+            err = (e.response.data or {}).get("error") if e.response is not None else None
+            if err == "ratelimited":
+                retry_after = float(e.response.headers.get("Retry-After", 30))
+                with self._lock:
+                    self._blocked_until = time.monotonic() + retry_after
+                return hit[0] if hit else None
+            if err in ("user_not_found", "user_not_visible"):
+                self.put(user_id, None)
+            return hit[0] if hit else None
+        except Exception:
+            return hit[0] if hit else None
+        finally:
+            with self._lock:
+                self._loading.pop(user_id, None)
+            ev.set()
+
+user_cache = ProfileCache(USER_CACHE_TTL_SEC, USER_CACHE_NEG_TTL_SEC, USER_CACHE_MAX)
+
+# --- 사용자 프로필 (캐시) ---
+def user_profile(client, user_id: str) -> dict | None:
+    return user_cache.get(client, user_id)
+
+# --- 디렉터리 미리 받기 ---
+# 시작 시와 USER_PREFETCH_SEC마다 users.list를 페이지 단위로 받아 캐시를 채운다.
+# 캐시 TTL보다 짧게 돌려서 출근 시간대 명령이 users_info를 기다리지 않게 한다. (0이면 끔)
+USER_PREFETCH_SEC = int(os.getenv("USER_PREFETCH_SEC") or 3000)
+USERS_LIST_PAGE_SIZE = 200
+USERS_LIST_PAGE_PAUSE = 3.0  # seconds (users.list는 Tier 2)
+
+def prefetch_users(client) -> int:
+    """users.list 전체를 캐시에 넣고 넣은 수를 반환."""
+    cursor, n = None, 0
+    while True:
+        try:
+            resp = client.users_list(limit=USERS_LIST_PAGE_SIZE, cursor=cursor)
+        except SlackApiError as e:
+            if e.response is not None and (e.response.data or {}).get("error") == "ratelimited":
+                time.sleep(float(e.response.headers.get("Retry-After", 30)))
+                continue
+            raise
+        for u in resp.get("members") or []:
+            if u.get("deleted") or u.get("is_bot") or u.get("id") == "USLACKBOT":
+                continue
+            user_cache.put(u["id"], profile_of(u))
+            n += 1
+        cursor = (resp.get("response_metadata") or {}).get("next_cursor")
+        if not cursor:
+            return n
+        time.sleep(USERS_LIST_PAGE_PAUSE)
+
+def _user_prefetch_loop(client):
+    while True:
+        try:
+            prefetch_users(client)
+        except Exception:
+            pass  # 다음 주기에 다시 (그동안은 users_info로 개별 조회)
+        time.sleep(USER_PREFETCH_SEC)
+
+def start_user_prefetch(client):
+    if USER_PREFETCH_SEC > 0:
+        threading.Thread(target=_user_prefetch_loop, args=(client,), name="user-prefetch", daemon=True).start()
+
 # --- 관리자 여부 확인 ---
 def is_admin(user_id: str, client=None) -> bool:
     # 1) ID 화이트리스트
@@ -105,33 +840,22 @@ def is_admin(user_id: str, client=None) -> bool:
         return True
     # 2) 이메일 화이트리스트
     if ADMIN_EMAIL_SET:
-        try:
-            info = client.users_info(user=user_id)
-            email = (info["user"]["profile"].get("email") or "").lower()
-            if email in ADMIN_EMAIL_SET:
-                return True
-        except Exception:
-            pass
+        p = user_profile(client, user_id)
+        if p and p["email"].lower() in ADMIN_EMAIL_SET:
+            return True
     return False
 
 # --- 사용자 키/이름 ---
 # --- 사용자 키 안전 조회 ---
 def safe_user_key(client, slack_user_id: str) -> str:
     """이메일 우선. 실패 시 Slack ID."""
-    try:
-        info = client.users_info(user=slack_user_id)
-        return info["user"]["profile"].get("email") or slack_user_id
-    except Exception:
-        return slack_user_id
+    p = user_profile(client, slack_user_id)
+    return (p and p["email"]) or slack_user_id
 
 # --- 사용자 이름 안전 조회 ---
 def safe_user_name(client, slack_user_id: str) -> str:
-    try:
-        info = client.users_info(user=slack_user_id)
-        p = info["user"]["profile"]
-        return p.get("display_name") or p.get("real_name") or slack_user_id
-    except Exception:
-        return slack_user_id
+    p = user_profile(client, slack_user_id)
+    return (p and (p["display_name"] or p["real_name"])) or slack_user_id
     
 # --- 시간/날짜 ------------------------------------------------------------
 
@@ -175,37 +899,177 @@ def parse_date(s):
     except Exception: 
         return None
 
-# --- 워크시트 가져오기 ---    
+# --- 워크시트 핸들/시트 목록 캐시 ---
+# sh.worksheet(name)은 호출마다 스프레드시트 메타데이터를 가져온다.
+# sh.worksheets() 한 번으로 전체 핸들을 받아 두고 WS_CACHE_TTL_SEC마다 갱신.
+# TTL이 지나면 일단 기존 값을 돌려주고 백그라운드에서 갱신(ACK 전 경로를 막지 않도록).
+# 없는 시트를 찾거나 "시트 없음" 오류가 나면 즉시 갱신.
+WS_CACHE_TTL_SEC = int(os.getenv("WS_CACHE_TTL_SEC") or 300)
+
+class WorksheetRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handles = {}       # title -> Worksheet
+        self._loaded_at = None   # time.monotonic()
+        self._refreshing = False
+
+    def refresh(self):
+        wss = with_retry(sh.worksheets)
+        with self._lock:
+            self._handles = {w.title: w for w in wss}
+            self._loaded_at = time.monotonic()
+
+    def _refresh_bg(self):
+        try:
+            self.refresh()
+        except Exception:
+            pass
+        finally:
+            self._refreshing = False
+
+    def _ensure(self):
+        at = self._loaded_at
+        if at is None:
+            self.refresh()
+        elif time.monotonic() - at >= WS_CACHE_TTL_SEC and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh_bg, name="ws-registry", daemon=True).start()
+
+    def titles(self) -> set:
+        self._ensure()
+        with self._lock:
+            return set(self._handles)
+
+    def get(self, name: str):
+        self._ensure()
+        ws = self._handles.get(name)
+        if ws is None:
+            self.refresh()  # 새로 만든 시트일 수 있음
+            ws = self._handles.get(name)
+        if ws is None:
+            raise WorksheetNotFound(name)
+        return ws
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+WS_REGISTRY = WorksheetRegistry()
+
+# --- 워크시트 가져오기 ---
 def get_ws(name: str):
-    return sh.worksheet(name)
+    try:
+        return WS_REGISTRY.get(name)
+    except Exception:
+        raise RuntimeError(f"시트 '{name}'를 찾을 수 없습니다.")
 
-# --- 지수적 백오프 재시도 ---
-def with_retry(fn):
-    for i in range(RETRY_MAX):
+# --- 재시도 정책 ---
+# 일시 오류(429/5xx/네트워크)만 재시도하고 나머지는 바로 올린다.
+# - 호출 기한: 첫 시도부터 RETRY_DEADLINE_SEC 안에서만 재시도 (요청 단위 기한이 있으면 더 짧은 쪽)
+# - 재시도 예산: 시도마다 RETRY_BUDGET_RATIO씩 쌓이고 재시도마다 1 소모 → 장애 시 재시도 폭주 방지
+# - Retry-After 헤더가 있으면 그만큼 기다린다
+# - 중첩 금지: 이미 재시도 루프 안이면 한 번만 호출하고 바깥 루프에 맡긴다
+RETRY_DEADLINE_SEC = float(os.getenv("RETRY_DEADLINE_SEC") or 10)
+INTERACTIVE_DEADLINE_SEC = float(os.getenv("INTERACTIVE_DEADLINE_SEC") or 6)  # 사용자가 기다리는 슬래시 커맨드
+RETRY_SLEEP_CAP = 4.0  # seconds
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO") or 0.1)
+RETRY_BUDGET_CAP = 20
+TRANSIENT_HTTP = {408, 429, 500, 502, 503, 504}
+TRANSIENT_EXC = (ConnectionError, TimeoutError,
+                 requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                 google.auth.exceptions.TransportError)
+
+class RetryBudget:
+    def __init__(self, ratio: float, cap: float):
+        self.ratio, self.cap = ratio, cap
+        self._tokens = cap
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.cap, self._tokens + self.ratio)
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int, base: float, deadline_sec: float, budget: RetryBudget):
+        self.max_attempts = max_attempts
+        self.base = base
+        self.deadline_sec = deadline_sec
+        self.budget = budget
+
+    @staticmethod
+    def classify(e: Exception) -> tuple:
+        """(일시 오류 여부, Retry-After 초 또는 None)"""
+        if isinstance(e, APIError):
+            resp = getattr(e, "response", None)
+            code = getattr(resp, "status_code", None)
+            if code in TRANSIENT_HTTP:
+                ra = (getattr(resp, "headers", None) or {}).get("Retry-After")
+                try:
+                    return True, float(ra) if ra is not None else None
+                except ValueError:
+                    return True, None
+            return False, None
+        return isinstance(e, TRANSIENT_EXC), None
+
+    def run(self, fn):
+        if getattr(_retry_local, "active", False):
+            return fn()  # 바깥 재시도 루프가 처리
+        deadline = time.monotonic() + self.deadline_sec
+        req_deadline = getattr(_retry_local, "deadline", None)
+        if req_deadline is not None:
+            deadline = min(deadline, req_deadline)
+        _retry_local.active = True
         try:
-            return fn()
-        except APIError as e:
-            # gspread APIError: e.response.status_code 사용 가능
-            code = getattr(getattr(e, "response", None), "status_code", None)
-            if code in (429, 500, 502, 503, 504):
-                sleep = RETRY_BASE * (2 ** i) + random.uniform(0, 0.3)
-                time.sleep(sleep)
-                continue
-            raise
-        except Exception:
-            # 네트워크 일시 오류류도 동일 전략(선택)
-            sleep = RETRY_BASE * (2 ** i) + random.uniform(0, 0.3)
-            time.sleep(sleep)
-            continue
-    # 마지막 실패를 명확히
-    raise RuntimeError("Google Sheets에 일시적으로 접근할 수 없습니다. 잠시 후 다시 시도해주세요.")
+            for i in range(self.max_attempts):
+                self.budget.deposit()
+                try:
+                    return fn()
+                except Exception as e:
+                    if isinstance(e, WorksheetNotFound) or "Unable to parse range" in str(e):
+                        # 시트 이름 변경/삭제 → 캐시된 핸들 폐기
+                        WS_REGISTRY.invalidate()
+                    transient, retry_after = self.classify(e)
+                    if not transient:
+                        raise
+                    sleep = retry_after if retry_after is not None else \
+                        random.uniform(0, min(RETRY_SLEEP_CAP, self.base * (2 ** i)))
+                    if (i + 1 >= self.max_attempts or time.monotonic() + sleep > deadline
+                            or not self.budget.spend()):
+                        # 마지막 실패를 명확히
+                        raise SheetsUnavailable("Google Sheets에 일시적으로 접근할 수 없습니다. 잠시 후 다시 시도해주세요.") from e
+                    time.sleep(sleep)
+        finally:
+            _retry_local.active = False
+
+RETRY_POLICY = RetryPolicy(RETRY_MAX, RETRY_BASE, RETRY_DEADLINE_SEC, RetryBudget(RETRY_BUDGET_RATIO, RETRY_BUDGET_CAP))
+
+# --- 요청 단위 기한: 이 블록 안의 재시도와 쿼터 대기는 seconds 안에 끝난다 ---
+@contextmanager
+def request_deadline(seconds: float):
+    prev = getattr(_retry_local, "deadline", None)
+    _retry_local.deadline = time.monotonic() + seconds
+    try:
+        yield
+    finally:
+        _retry_local.deadline = prev
+
+# --- 재시도 실행 ---
+def with_retry(fn):
+    return RETRY_POLICY.run(fn)
 
 # --- 예외를 사람이 읽을 수 있는 메시지로 변환 ---            
 def human_error(e: Exception) -> str:
     s = str(e)
-    if "이미 오늘" in s or "이미 해당 날짜" in s:
+    if isinstance(e, SheetsUnavailable):
         return s
-    if "중복 처리 중" in s:
+    if "이미 오늘" in s or "이미 해당 날짜" in s:
         return s
     us = s.upper()
     if "PERMISSION" in us or "INSUFFICIENT" in us:
@@ -214,19 +1078,812 @@ def human_error(e: Exception) -> str:
         return "요청이 많습니다. 잠시 후 다시 시도하세요."
     return "처리 중 오류가 발생했습니다."
 
+# =========================================================
+# 로컬 SQLite 미러 (선택)
+# ---------------------------------------------------------
+# SQLITE_MIRROR_PATH를 주면 모든 시트 읽기를 로컬 SQLite에서 처리하고
+# 쓰기는 Google Sheets에 먼저 반영한 뒤 미러에도 적용(write-through).
+# 시트 UI에서 사람이 고친 내용은 MIRROR_RECONCILE_SEC마다
+# values_batch_get 한 번으로 전 시트를 다시 받아 맞춘다.
+# =========================================================
+SQLITE_MIRROR_PATH = os.getenv("SQLITE_MIRROR_PATH") or ""
+MIRROR_RECONCILE_SEC = int(os.getenv("MIRROR_RECONCILE_SEC") or 60)
+
+class SheetMirror:
+    """시트 행을 (sheet, rownum) 단위로 보관. 조회 키 컬럼에 인덱스."""
+
+    KEY_COLS = ("user_key", "date", "type", "week")
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS rows(
+                sheet TEXT NOT NULL, rownum INTEGER NOT NULL, cells TEXT NOT NULL,
+                user_key TEXT, date TEXT, type TEXT, week TEXT,
+                PRIMARY KEY(sheet, rownum));
+            CREATE INDEX IF NOT EXISTS rows_user_date_type ON rows(sheet, user_key, date, type);
+            CREATE INDEX IF NOT EXISTS rows_week_user ON rows(sheet, week, user_key);
+        """)
+        self._heads = {}     # sheet -> {키컬럼: 위치}
+        self._gen = {}       # sheet -> 쓰기 세대 (재동기화 경합 감지)
+        self._loaded = set() # 이 미러에 적재된 시트 (빈 시트 포함)
+        for (sheet, cells) in self._db.execute("SELECT sheet, cells FROM rows WHERE rownum = 1"):
+            self._heads[sheet] = self._key_positions(json.loads(cells))
+            self._loaded.add(sheet)
+
+    @staticmethod
+    def _key_positions(head: list) -> dict:
+        idx = {str(h).strip().lower(): i for i, h in enumerate(head)}
+        pos = {k: idx.get(k) for k in SheetMirror.KEY_COLS}
+        if pos["user_key"] is None:
+            pos["user_key"] = idx.get("user_id")
+        return pos
+
+    def _keys(self, sheet: str, rownum: int, r: list) -> tuple:
+        if rownum == 1:
+            return (None,) * len(self.KEY_COLS)
+        pos = self._heads.get(sheet) or {}
+        out = []
+        for k in self.KEY_COLS:
+            i = pos.get(k)
+            v = str(r[i]).strip() if i is not None and i < len(r) else ""
+            out.append(v.lower() if k in ("user_key", "type") else v)
+        return tuple(out)
+
+    def _put(self, sheet: str, rownum: int, r: list):
+        """lock 보유 상태에서 호출."""
+        if rownum == 1:
+            self._heads[sheet] = self._key_positions(r)
+        self._db.execute("INSERT OR REPLACE INTO rows VALUES (?,?,?,?,?,?,?)",
+                         (sheet, rownum, json.dumps(r, ensure_ascii=False)) + self._keys(sheet, rownum, r))
+
+    def has(self, sheet: str) -> bool:
+        return sheet in self._loaded
+
+    def generation(self, sheet: str) -> int:
+        return self._gen.get(sheet, 0)
+
+    def load(self, sheet: str, vals: list, gen: int | None = None) -> bool:
+        """시트 전체 교체. gen이 주어졌고 그 사이 쓰기가 있었으면 건너뛴다."""
+        with self._lock:
+            if gen is not None and self._gen.get(sheet, 0) != gen:
+                return False
+            self._heads[sheet] = self._key_positions(vals[0] if vals else [])
+            with self._db:
+                self._db.execute("DELETE FROM rows WHERE sheet = ?", (sheet,))
+                for rn, r in enumerate(vals, start=1):
+                    self._put(sheet, rn, list(r))
+            self._loaded.add(sheet)
+            return True
+
+    def values(self, sheet: str, r0: int = 1, r1: int | None = None) -> list:
+        """
+        get_all_values와 같은 모양 (빈 행 포함, 직사각형 패딩).
+        r0/r1을 주면 그 행 구간만 SQL에서 골라 디코딩한다 (결과 첫 행이 r0).
+        """
+        sql, args = "SELECT rownum, cells FROM rows WHERE sheet = ? AND rownum >= ?", [sheet, r0]
+        if r1 is not None:
+            sql += " AND rownum <= ?"
+            args.append(r1)
+        with self._lock:
+            got = self._db.execute(sql + " ORDER BY rownum", args).fetchall()
+        if not got:
+            return []
+        out = [[] for _ in range(got[-1][0] - r0 + 1)]
+        for rn, cells in got:
+            out[rn - r0] = json.loads(cells)
+        width = max(len(r) for r in out)
+        return [r + [""] * (width - len(r)) for r in out]
+
+    def append(self, sheet: str, start_row: int, rows: list):
+        with self._lock, self._db:
+            self._gen[sheet] = self._gen.get(sheet, 0) + 1
+            for i, r in enumerate(rows):
+                self._put(sheet, start_row + i, [str(v) for v in r])
+
+    def set_cells(self, sheet: str, a1: str, values: list):
+        r0, c0 = a1_start(a1)
+        with self._lock, self._db:
+            self._gen[sheet] = self._gen.get(sheet, 0) + 1
+            for i, vals in enumerate(values):
+                rn = r0 + i
+                got = self._db.execute("SELECT cells FROM rows WHERE sheet = ? AND rownum = ?", (sheet, rn)).fetchone()
+                row = json.loads(got[0]) if got else []
+                if len(row) < c0 + len(vals):
+                    row += [""] * (c0 + len(vals) - len(row))
+                for j, v in enumerate(vals):
+                    row[c0 + j] = "" if v is None else str(v)
+                self._put(sheet, rn, row)
+
+    def find(self, sheet: str, **eq) -> list:
+        """키 컬럼 동등 조회 (user_key/type은 소문자 비교). [(rownum, cells)]"""
+        conds, args = ["sheet = ?", "rownum > 1"], [sheet]
+        for k, v in eq.items():
+            if k not in self.KEY_COLS:
+                raise ValueError(k)
+            v = (v or "").strip()
+            conds.append(f"{k} = ?")
+            args.append(v.lower() if k in ("user_key", "type") else v)
+        with self._lock:
+            got = self._db.execute(
+                f"SELECT rownum, cells FROM rows WHERE {' AND '.join(conds)} ORDER BY rownum", args).fetchall()
+        return [(rn, json.loads(cells)) for rn, cells in got]
+
+    def sheets(self) -> list:
+        return sorted(self._loaded)
+
+    def header(self, sheet: str) -> list:
+        with self._lock:
+            got = self._db.execute("SELECT cells FROM rows WHERE sheet = ? AND rownum = 1", (sheet,)).fetchone()
+        return json.loads(got[0]) if got else []
+
+class MirroredWorksheet:
+    """gspread Worksheet 대리 객체. 읽기는 미러, 쓰기는 시트 → 미러."""
+
+    def __init__(self, ws, mirror: SheetMirror):
+        self._ws = ws
+        self._mirror = mirror
+
+    def __getattr__(self, name):
+        return getattr(self._ws, name)
+
+    def _ensure(self):
+        if not self._mirror.has(self._ws.title):
+            self._mirror.load(self._ws.title, self._ws.get_all_values())
+
+    def get_all_values(self, *args, **kwargs):
+        self._ensure()
+        return self._mirror.values(self._ws.title)
+
+    def get(self, range_name=None, *args, **kwargs):
+        # 행 구간은 SQL에서 거르고 열만 여기서 자른다 (꼬리 읽기/조각 읽기가 시트 전체를 디코딩하지 않게)
+        self._ensure()
+        r0, c0, r1, c1 = a1_bounds(range_name) if range_name else (1, 0, None, None)
+        return clip_rows(self._mirror.values(self._ws.title, r0, r1), c0, c1)
+
+    def batch_get(self, ranges, *args, **kwargs):
+        return [self.get(a) for a in ranges]
+
+    def append_row(self, values, *args, **kwargs):
+        return self.append_rows([values], *args, **kwargs)
+
+    def append_rows(self, values, *args, **kwargs):
+        self._ensure()
+        resp = self._ws.append_rows(values, *args, **kwargs)
+        rng = ((resp or {}).get("updates") or {}).get("updatedRange")
+        if rng:
+            self._mirror.append(self._ws.title, a1_start(rng)[0], values)
+        else:
+            self._mirror.load(self._ws.title, self._ws.get_all_values())
+        return resp
+
+    def update(self, range_name=None, values=None, *args, **kwargs):
+        if not isinstance(range_name, str):  # 예전 호출 순서 (values, range)
+            range_name, values = values, range_name
+        resp = self._ws.update(range_name=range_name, values=values, *args, **kwargs)
+        if self._mirror.has(self._ws.title):
+            self._mirror.set_cells(self._ws.title, range_name, values)
+        return resp
+
+    def batch_update(self, data, *args, **kwargs):
+        resp = self._ws.batch_update(data, *args, **kwargs)
+        if self._mirror.has(self._ws.title):
+            for d in data:
+                self._mirror.set_cells(self._ws.title, d["range"], d["values"])
+        return resp
+
+class MirroredSpreadsheet:
+    """gspread Spreadsheet 대리 객체. 워크시트를 MirroredWorksheet로 감싼다."""
+
+    def __init__(self, sh_, mirror: SheetMirror):
+        self._sh = sh_
+        self.mirror = mirror
+
+    def __getattr__(self, name):
+        return getattr(self._sh, name)
+
+    def worksheet(self, name):
+        return MirroredWorksheet(self._sh.worksheet(name), self.mirror)
+
+    def worksheets(self, *args, **kwargs):
+        return [MirroredWorksheet(w, self.mirror) for w in self._sh.worksheets(*args, **kwargs)]
+
+    def add_worksheet(self, *args, **kwargs):
+        return MirroredWorksheet(self._sh.add_worksheet(*args, **kwargs), self.mirror)
+
+    def reconcile(self):
+        """미러에 있는 시트 전부를 values_batch_get 한 번으로 다시 받아 교체."""
+        names = self.mirror.sheets()
+        if not names:
+            return
+        gens = {n: self.mirror.generation(n) for n in names}
+        resp = with_retry(lambda: self._sh.values_batch_get([f"'{n}'" for n in names]))
+        for n, vr in zip(names, resp.get("valueRanges", [])):
+            # 받는 사이 쓰기가 있었던 시트는 다음 주기에 맞춘다
+            self.mirror.load(n, vr.get("values", []), gen=gens[n])
+
+# --- 미러 재동기화 루프 (시작 시 1회 포함) ---
+def _mirror_reconcile_loop(msh: MirroredSpreadsheet):
+    while True:
+        try:
+            msh.reconcile()
+        except Exception:
+            pass
+        time.sleep(MIRROR_RECONCILE_SEC)
+
+# --- 미러 인덱스 조회 → sheet_rows_as_dicts 모양 (미러가 없으면 None) ---
+def mirror_find(sheet: str, **eq) -> list | None:
+    if not isinstance(sh, MirroredSpreadsheet):
+        return None
+    if not sh.mirror.has(sheet):
+        get_ws(sheet).get_all_values()  # 아직 안 읽은 시트면 적재
+    headers = [str(h).strip() for h in sh.mirror.header(sheet)]
+    out = []
+    for _, cells in sh.mirror.find(sheet, **eq):
+        out.append({h: (cells[i] if i < len(cells) else "") for i, h in enumerate(headers) if h})
+    return out
+
+if SQLITE_MIRROR_PATH:
+    sh = MirroredSpreadsheet(sh, SheetMirror(SQLITE_MIRROR_PATH))
+    threading.Thread(target=_mirror_reconcile_loop, args=(sh,), name="sheet-mirror", daemon=True).start()
+
 # =========================================================
 # logs 기록 / 중복 체크
 # =========================================================
 
-# 인플라이트 처리용 잠금 및 집합
-_inflight_lock = threading.Lock()
-_inflight = set()  # idempotency key 잠금
+# --- 키 단위 single-flight ---
+# 같은 키(user|type|date|반차 구분)로 동시에 들어온 같은 내용의 요청은 먼저 온 요청의 결과(성공/예외)를 함께 받는다.
+# 키는 같은데 내용이 다르면 먼저 온 요청이 끝날 때까지 기다렸다가 중복 검사부터 따로 한다.
+# 잠금은 키 해시로 나눈 스트라이프 단위라 서로 다른 키끼리는 거의 부딪히지 않는다.
+class SingleFlight:
+    def __init__(self, stripes: int = 64):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._calls = [{} for _ in range(stripes)]  # key -> (Future, 요청 내용)
+
+    def begin(self, key: str, sig=None) -> tuple:
+        """(선두 여부, 공유 Future, 내용 일치 여부).
+        선두가 아니고 내용(sig)도 같으면 공유 Future를 기다리면 된다."""
+        i = hash(key) % len(self._locks)
+        with self._locks[i]:
+            cur = self._calls[i].get(key)
+            if cur is not None:
+                return False, cur[0], cur[1] == sig
+            fut = Future()
+            self._calls[i][key] = (fut, sig)
+            return True, fut, True
+
+    def finish(self, key: str, fut: Future, *, src: Future | None = None, exc: BaseException | None = None):
+        """선두가 끝나면 키를 풀고 결과를 공유 Future에 옮긴다."""
+        i = hash(key) % len(self._locks)
+        with self._locks[i]:
+            cur = self._calls[i].get(key)
+            if cur is not None and cur[0] is fut:
+                del self._calls[i][key]
+        if src is not None:
+            exc = src.exception()
+        if exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(src.result() if src is not None else None)
 
-# --- 로그 기록 추가 ---    
-def append_log(user_key, user_name, type_, note="", date_str="", by_user=None):
+APPEND_FLIGHT = SingleFlight()
+
+# =========================================================
+# 여러 범위 한 번에 읽기 (values_batch_get) + 컬럼 투영
+# =========================================================
+# 범위는 (시트명, A1 또는 None=시트 전체) 튜플로 다룬다.
+# 투영: 필요한 컬럼들을 덮는 연속 열 구간만 읽는다 (위치는 마지막으로 본 헤더 기준).
+SHEET_HEADS = {}  # 시트명 -> 마지막으로 읽은 헤더 (소문자)
+
+def fetch_ranges(ranges: list) -> list:
+    """[(시트, A1)] → 범위별 값. values_batch_get 1회 (미러 사용 중이면 로컬에서)."""
+    if not ranges:
+        return []
+    if isinstance(sh, MirroredSpreadsheet):
+        return [get_ws(name).get(a1) for name, a1 in ranges]
+    vrs = with_retry(lambda: sh.values_batch_get(
+        [f"'{name}'!{a1}" if a1 else f"'{name}'" for name, a1 in ranges])).get("valueRanges", [])
+    vrs += [{}] * (len(ranges) - len(vrs))
+    return [vr.get("values", []) for vr in vrs]
+
+def lower_head(row) -> list:
+    return [str(h).strip().lower() for h in (row or [])]
+
+# --- 컬럼 이름들을 덮는 (첫 열, 끝 열) 0-based. 하나라도 없으면 None ---
+def column_span(head: list, cols) -> tuple | None:
+    pos = [head.index(c) for c in cols if c in head]
+    if not cols or len(pos) != len(cols):
+        return None
+    return min(pos), max(pos)
+
+def span_a1(span: tuple, row: int = 1) -> str:
+    return f"{col_letter(span[0])}{row}:{col_letter(span[1])}"
+
+# --- 큰 시트 나눠 읽기 ---
+# get_all_values()는 전 행·전 열을 한 번에 메모리에 올린다. 스캔 용도는 헤더를 먼저 읽고
+# 필요한 컬럼을 덮는 열 구간을 SHEET_CHUNK_ROWS 행씩 이어 읽어, 한 번에 한 조각만 들고 있게 한다.
+# 조각이 덜 차서 돌아오면(끝 빈 행 생략) 끝. 꽉 차서 돌아왔는데 시트 행 수(row_count)에 닿았으면
+# 캐시된 핸들이 오래됐을 수 있으니 그때만 다시 받아 확인한다 (격자 밖은 읽을 수 없음).
+SHEET_CHUNK_ROWS = int(os.getenv("SHEET_CHUNK_ROWS") or 5000)
+
+class SheetStream:
+    """
+    시트 행을 조각 단위로 읽는 반복자. cols(소문자)를 주면 그중 시트에 있는 컬럼들을 덮는 열 구간만 읽는다.
+    head/col은 읽는 구간 기준 (head: 헤더 원문, col: 소문자 헤더 -> 행 안 위치), offset은 구간 첫 열 (0-based).
+    """
+
+    def __init__(self, name: str, cols=None, chunk_rows: int | None = None):
+        self.name = name
+        self.chunk_rows = chunk_rows or SHEET_CHUNK_ROWS
+        raw = [str(h).strip() for h in (fetch_ranges([(name, "1:1")])[0] or [[]])[0]]
+        full = lower_head(raw)
+        pos = [i for i, h in enumerate(full) if h and (cols is None or h in cols)]
+        lo, hi = (min(pos), max(pos)) if pos else (0, -1)
+        self.offset = lo
+        self.head = raw[lo:hi + 1]
+        self.col = {h.lower(): i for i, h in enumerate(self.head) if h}
+        SHEET_HEADS[name] = full
+
+    def rows(self):
+        """(행 번호, 구간 값 리스트 — 폭에 맞춰 채움). 헤더 행은 제외."""
+        width = len(self.head)
+        if not width:
+            return
+        span = (self.offset, self.offset + width - 1)
+        start = 2
+        while True:
+            end = start + self.chunk_rows - 1
+            a1 = f"{col_letter(span[0])}{start}:{col_letter(span[1])}{end}"
+            vals = fetch_ranges([(self.name, a1)])[0]
+            for rn, r in enumerate(vals, start=start):
+                r = list(r[:width])
+                yield rn, r + [""] * (width - len(r))
+            if len(vals) < self.chunk_rows:
+                return
+            if end >= getattr(get_ws(self.name), "row_count", 0):
+                WS_REGISTRY.refresh()
+                if end >= getattr(get_ws(self.name), "row_count", 0):
+                    return
+            start = end + 1
+
+    def records(self):
+        """(행 번호, {헤더 원문: 값}) — sheet_rows_as_dicts와 같은 모양."""
+        named = [(h, i) for i, h in enumerate(self.head) if h]
+        for rn, r in self.rows():
+            yield rn, {h: r[i] for h, i in named}
+
+# --- logs 인메모리 저장소 ---
+# logs를 열 단위 배열로 보관 (user_key는 정수 ID로 intern, date는 ordinal, type/반차구분은 작은 정수).
+# 문자열 정리/날짜 파싱은 행을 받아들일 때 한 번만 한다.
+# 중복 검사용 인덱스: (user_id, date_ord, type) -> (구분없음, 오전, 오후) 건수.
+# logs는 append만 되므로 마지막으로 읽은 행 수(n)를 기억했다가 A{n+1}:H만 이어 읽는다.
+# 헤더가 바뀌었거나 n번째 행이 달라졌으면(중간 삭제/삽입) 전체를 다시 읽는다.
+# 중간 행 내용 수정은 감지할 수 없으므로 LOGS_FULL_RELOAD_SEC 주기로 전체를 다시 읽어 반영.
+# 저장소가 쓰는 컬럼(LOGS_STORE_COLS)을 덮는 열 구간만 읽고, 헤더 행(A1:H1)으로 위치가 그대로인지 확인한다.
+# 읽기는 _plan → fetch_ranges → _apply로 나눠 다른 시트 읽기와 한 번에 묶을 수 있다 (sync_with).
+LOGS_LAST_COL = "H"
+LOGS_SYNC_SEC = float(os.getenv("LOGS_SYNC_SEC") or 15)
+LOGS_FULL_RELOAD_SEC = int(os.getenv("LOGS_FULL_RELOAD_SEC") or 3600)
+LOGS_UPDATED_RANGE_RE = re.compile(r"![A-Z]+(\d+)(?::[A-Z]+(\d+))?$")
+LOGS_STORE_COLS = ("user_key", "user_name", "type", "note", "date")
+
+class LogType(IntEnum):
+    OTHER = 0
+    CHECKIN = 1
+    CHECKOUT = 2
+    ANNUAL = 3
+    HALFDAY = 4
+    OFF = 5
+
+LOG_TYPE_CODES = {
+    "checkin": LogType.CHECKIN, "checkout": LogType.CHECKOUT,
+    "annual": LogType.ANNUAL, "halfday": LogType.HALFDAY, "off": LogType.OFF,
+}
+HALF_CODES = {"": 0, "am": 1, "pm": 2}
+
+# --- 반차 메모에서 오전/오후 구분 추출 ---
+def half_period_of(note: str | None) -> str:
+    n = note or ""
+    if "(오전)" in n:
+        return "am"
+    if "(오후)" in n:
+        return "pm"
+    return ""
+
+# --- logs 헤더에서 주요 컬럼 위치 ---
+def logs_cols(head: list) -> dict:
+    idx = {h.strip().lower(): i for i, h in enumerate(head)}
+    iu = idx["user_key"] if "user_key" in idx else idx.get("user_id")
+    return {"user": iu, "name": idx.get("user_name"), "type": idx.get("type"),
+            "date": idx.get("date"), "note": idx.get("note")}
+
+# --- 값 API는 행 끝 빈 셀을 생략하므로 비교 전에 정리 ---
+def _trim_row(r) -> list:
+    r = list(r)
+    while r and r[-1] == "":
+        r.pop()
+    return r
+
+# --- 날짜 문자열 -> ordinal (형식 오류면 0) ---
+def ymd_ordinal(s: str | None) -> int:
+    d = parse_ymd_safe((s or "").strip())
+    return d.toordinal() if d else 0
+
+class LogColumns:
+    """logs 열 배열 (append-only). 스냅샷은 앞 n행만 본다."""
+
+    def __init__(self):
+        self.user = array("i")   # user_id (user_keys 위치)
+        self.name = array("i")   # name_id (names 위치)
+        self.date = array("i")   # date.toordinal(), 형식 오류면 0
+        self.type = array("b")   # LogType
+        self.half = array("b")   # HALF_CODES
+        self.user_keys = []      # user_id -> 처음 본 user_key 원문
+        self.user_ids = {}       # 정규화 user_key -> user_id
+        self.names = []
+        self.name_ids = {}
+        self.rows_of = {}        # user_id -> array("i") 행 위치 (오름차순)
+
+    def __len__(self):
+        return len(self.type)
+
+    def _intern_user(self, raw: str) -> int:
+        k = raw.strip().lower()
+        uid = self.user_ids.get(k)
+        if uid is None:
+            uid = self.user_ids[k] = len(self.user_keys)
+            self.user_keys.append(raw.strip())
+        return uid
+
+    def _intern_name(self, raw: str) -> int:
+        k = raw.strip()
+        nid = self.name_ids.get(k)
+        if nid is None:
+            nid = self.name_ids[k] = len(self.names)
+            self.names.append(k)
+        return nid
+
+    def append(self, user_key: str, user_name: str, type_: str, date_str: str, note: str):
+        """추가된 행 위치와 인덱스 키를 반환. user_key가 비었으면 키는 None."""
+        i = len(self.type)
+        uid = self._intern_user(user_key or "")
+        o = ymd_ordinal(date_str)
+        t = LOG_TYPE_CODES.get((type_ or "").strip().lower(), LogType.OTHER)
+        h = HALF_CODES[half_period_of(note)]
+        self.user.append(uid)
+        self.name.append(self._intern_name(user_name or ""))
+        self.date.append(o)
+        self.type.append(t)
+        self.half.append(h)
+        self.rows_of.setdefault(uid, array("i")).append(i)
+        key = (uid, o, t) if (user_key or "").strip() and o and t else None
+        return key, h
+
+class LogsSnapshot:
+    """요청 단위 logs 스냅샷(불변). 한 번 읽어서 요청 안의 모든 조회가 공유."""
+
+    def __init__(self, columns: LogColumns, n: int, idx: MappingProxyType):
+        self.columns = columns  # 저장소와 공유 (append-only). 앞 n행만 본다.
+        self.n = n
+        self._idx = idx
+
+    def user_id(self, user_key: str | None) -> int | None:
+        return self.columns.user_ids.get((user_key or "").strip().lower())
+
+    def user_rows(self, user_key: str | None):
+        """해당 사용자의 행 위치 (스냅샷 범위 안)."""
+        uid = self.user_id(user_key)
+        rows = self.columns.rows_of.get(uid) if uid is not None else None
+        if not rows:
+            return ()
+        return rows[:bisect.bisect_left(rows, self.n)]
+
+    def count(self, user_key, type_, date_str, period: str | None = None, alt_user_key: str | None = None) -> int:
+        return index_count(self.columns, self._idx, user_key, type_, date_str, period, alt_user_key)
+
+# --- 인덱스에서 (user_key 또는 alt_user_key, date, type) 건수 ---
+def index_count(columns: LogColumns, idx, user_key, type_, date_str, period: str | None = None,
+                alt_user_key: str | None = None) -> int:
+    t = LOG_TYPE_CODES.get((type_ or "").strip().lower())
+    o = ymd_ordinal(date_str)
+    if t is None or not o:
+        return 0
+    users = {(user_key or "").strip().lower(), (alt_user_key or "").strip().lower()} - {""}
+    n = 0
+    for u in users:
+        uid = columns.user_ids.get(u)
+        counts = idx.get((uid, o, t)) if uid is not None else None
+        if not counts:
+            continue
+        if period is None:
+            n += sum(counts)
+        elif period in HALF_CODES:
+            n += counts[HALF_CODES[period]]
+    return n
+
+class LogsStore:
+    """logs 꼬리 추적 저장소. 중복 검사는 네트워크 없이 O(1)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync_lock = threading.RLock()  # 동기화/직접 append 반영은 한 스레드만
+        self._head = []               # 투영된 헤더 (저장소 행 기준)
+        self._full_head = []          # 시트 헤더 원문 (A:H)
+        self._span = None             # 읽는 열 구간 (0-based), None이면 A:H 전체
+        self._cols = logs_cols([])
+        self._columns = LogColumns()  # 전체 재로드 시 새 객체로 교체
+        self._last = []               # 마지막 행 (투영 후, 꼬리 비교용)
+        self._idx = {}
+        self._synced_at = None        # 마지막 동기화 (time.monotonic())
+        self._full_at = None          # 마지막 전체 로드
+
+    @property
+    def n(self) -> int:
+        """시트에서 읽어 들인 행 수 (헤더 포함)."""
+        return len(self._columns) + 1 if self._head else 0
+
+    def _ingest(self, rows: list):
+        """lock 보유 상태에서 호출. 새 행을 열 배열/인덱스에 반영."""
+        c = self._cols
+        iu, iname, it, idate, inote = c["user"], c["name"], c["type"], c["date"], c["note"]
+        width = len(self._head)
+        for r in rows:
+            r = list(r)[:width]
+            r += [""] * (width - len(r))
+            self._last = r
+            cell = lambda i: r[i] if i is not None else ""
+            key, h = self._columns.append(cell(iu), cell(iname), cell(it), cell(idate), cell(inote))
+            if key is None:
+                continue
+            # 튜플은 불변이라 스냅샷과 공유해도 안전
+            counts = list(self._idx.get(key) or (0, 0, 0))
+            counts[h] += 1
+            self._idx[key] = tuple(counts)
+
+    def _load_values(self, vals: list, full_head: list | None = None):
+        """full_head가 없으면 vals는 A:H 전체 행 (여기서 투영), 있으면 그 헤더 기준으로 이미 투영된 값."""
+        if full_head is None:
+            full_head = _trim_row(vals[0]) if vals else []
+            span = column_span(lower_head(full_head), LOGS_STORE_COLS)
+            if span:
+                vals = [r[span[0]:span[1] + 1] for r in vals]
+        else:
+            span = column_span(lower_head(full_head), LOGS_STORE_COLS)
+        with self._lock:
+            self._full_head, self._span = full_head, span
+            self._head = list(vals[0]) if vals else []
+            self._cols = logs_cols(self._head)
+            self._columns, self._idx, self._last = LogColumns(), {}, list(self._head)
+            if self._cols["user"] is not None and self._cols["type"] is not None and self._cols["date"] is not None:
+                self._ingest(vals[1:])
+            self._synced_at = self._full_at = time.monotonic()
+
+    def _due(self, force: bool = False) -> bool:
+        return force or self._synced_at is None or time.monotonic() - self._synced_at >= LOGS_SYNC_SEC
+
+    def _plan(self) -> tuple:
+        """(종류, 계획 시점의 n, 범위 목록). 종류: "full"(A:H 전체) / "proj"(투영 구간 전체) / "tail"."""
+        if not self._head or self._full_at is None or time.monotonic() - self._full_at >= LOGS_FULL_RELOAD_SEC:
+            if self._span is None:
+                return "full", 0, [("logs", f"A1:{LOGS_LAST_COL}")]
+            return "proj", 0, [("logs", f"A1:{LOGS_LAST_COL}1"), ("logs", span_a1(self._span))]
+        n, span = self.n, self._span or (0, col_index(LOGS_LAST_COL))
+        return "tail", n, [("logs", f"A1:{LOGS_LAST_COL}1"), ("logs", span_a1(span, n))]
+
+    def _apply(self, plan: tuple, got: list):
+        """_plan 범위를 읽은 결과 반영. 헤더/꼬리가 어긋나면 A:H 전체를 다시 읽는다."""
+        kind, n, _ = plan
+        if kind == "full":
+            return self._load_values(got[0])
+        head_row = _trim_row((got[0] or [[]])[0])
+        if kind == "proj":
+            if column_span(lower_head(head_row), LOGS_STORE_COLS) == self._span:
+                return self._load_values(got[1], head_row)
+        else:
+            tail = got[1]
+            with self._lock:
+                if (head_row == _trim_row(self._full_head) and self.n == n
+                        and tail and _trim_row(tail[0]) == _trim_row(self._last)):
+                    self._ingest(tail[1:])
+                    self._synced_at = time.monotonic()
+                    return
+        self._load_values(fetch_ranges([("logs", f"A1:{LOGS_LAST_COL}")])[0])
+
+    def sync_with(self, ranges=(), force: bool = False, before=None) -> list:
+        """
+        다른 범위 읽기에 logs 동기화(필요할 때만)를 얹어 values_batch_get 한 번으로.
+        ranges 결과를 before(결과)에 거쳐 돌려준다. before는 logs 반영 전에 불린다 (holidays 등).
+        """
+        ranges = list(ranges)
+        before = before or (lambda got: got)
+        if self._due(force):
+            with self._sync_lock:
+                if self._due(force):
+                    plan = self._plan()
+                    got = fetch_ranges(ranges + plan[2])
+                    mine = before(got[:len(ranges)])
+                    self._apply(plan, got[len(ranges):])
+                    return mine
+        return before(fetch_ranges(ranges))
+
+    def sync(self, force: bool = False):
+        """LOGS_SYNC_SEC가 지났으면 꼬리만 이어 읽는다."""
+        self.sync_with((), force)
+
+    def invalidate(self):
+        with self._lock:
+            self._full_at = self._synced_at = None
+
+    def appended(self, rows: list, updated_range: str | None):
+        """직접 append한 행 반영. 바로 뒤에 붙은 경우만 즉시 넣고, 아니면 꼬리 동기화."""
+        m = LOGS_UPDATED_RANGE_RE.search(updated_range or "")
+        with self._sync_lock:  # 진행 중인 동기화가 끝난 뒤 판단
+            with self._lock:
+                if not self._head:
+                    return  # 아직 로드 전이면 다음 로드에 포함된다
+                if m and int(m.group(1)) == self.n + 1:
+                    lo, hi = self._span or (0, len(self._head) - 1)
+                    self._ingest([list(r)[lo:hi + 1] for r in rows])
+                    return
+            # 그 사이 다른 곳에서 추가된 행이 있음 → 시트 기준으로 이어 읽기
+            self.sync(force=True)
+
+    def _sync_or_stale(self):
+        try:
+            self.sync()
+        except SheetsUnavailable:
+            if not self._head:
+                raise
+            # 장애 중에는 마지막으로 읽은 내용으로 계속 응답 (중복 검사 등 읽기 전용 용도)
+
+    def snapshot(self) -> LogsSnapshot:
+        self._sync_or_stale()
+        with self._lock:
+            return LogsSnapshot(self._columns, len(self._columns), MappingProxyType(dict(self._idx)))
+
+    def peek(self) -> LogsSnapshot:
+        """동기화 없이 지금 가진 내용의 스냅샷 (처음 한 번만 로드)."""
+        if not self._head:
+            self._sync_or_stale()
+        with self._lock:
+            return LogsSnapshot(self._columns, len(self._columns), MappingProxyType(self._idx))
+
+    def count(self, user_key, type_, date_str, period: str | None = None, alt_user_key: str | None = None) -> int:
+        """period=None이면 오전/오후 구분 없이 합산."""
+        self._sync_or_stale()
+        with self._lock:
+            return index_count(self._columns, self._idx, user_key, type_, date_str, period, alt_user_key)
+
+LOGS_STORE = LogsStore()
+
+# --- 핸들러 읽기 묶음 ---
+# 핸들러가 필요한 시트를 {시트명: 컬럼 이름 튜플 또는 None(전체)}로 먼저 선언하면 values_batch_get 한 번으로 읽는다.
+# "logs"는 LOGS_STORE 동기화가 필요할 때만, "holidays"는 캐시가 비었을 때만 끼워 넣는다 (둘 다 반환값에는 없음).
+READS_BALANCE = {"balances": None, "logs": None, "holidays": None}
+
+def batch_read(reads: dict) -> dict:
+    """{시트명: 값(헤더 포함)}. 컬럼을 지정한 시트는 그 컬럼들을 덮는 열 구간만 (위치는 헤더로 찾는다)."""
+    names = [n for n in reads if n not in ("logs", "holidays")]
+    spans = {n: column_span(SHEET_HEADS.get(n) or [], reads[n] or ()) for n in names}
+    ranges = [(n, span_a1(spans[n]) if spans[n] else None) for n in names]
+    want_holidays = "holidays" in reads and HOLIDAYS_CACHE is None
+    if want_holidays:
+        ranges.append(("holidays", None))
+
+    def take_holidays(got: list) -> list:
+        global HOLIDAYS_CACHE
+        if want_holidays:  # logs 반영(영업일 판정)보다 먼저
+            HOLIDAYS_CACHE = parse_holidays(got.pop())
+        return got
+
+    if "logs" in reads:
+        got = LOGS_STORE.sync_with(ranges, before=take_holidays)
+    else:
+        got = take_holidays(fetch_ranges(ranges))
+    return {n: _projected(n, vals, reads[n], spans[n]) for n, vals in zip(names, got)}
+
+def _projected(name: str, vals: list, cols, span: tuple | None) -> list:
+    head = lower_head(vals[0] if vals else [])
+    if span is None:
+        SHEET_HEADS[name] = head
+        span = column_span(head, cols or ())
+        return [r[span[0]:span[1] + 1] for r in vals] if span else vals
+    if head == SHEET_HEADS[name][span[0]:span[1] + 1]:
+        return vals
+    # 헤더가 바뀜 → 전체를 다시 읽어 위치를 다시 잡는다
+    return _projected(name, fetch_ranges([(name, None)])[0], cols, None)
+
+# --- logs 스냅샷 (필요하면 꼬리만 이어 읽음) ---
+def take_logs_snapshot() -> LogsSnapshot:
+    return LOGS_STORE.snapshot()
+
+# --- logs 쓰기 지연 큐 ---
+# append_log 행을 짧은 시간(LOG_FLUSH_WINDOW_SEC) 또는 최대 LOG_FLUSH_MAX_ROWS개까지 모아
+# append_rows 한 번으로 기록한다. 각 호출자는 자기 행이 포함된 flush 결과(Future)를 받는다.
+LOG_FLUSH_WINDOW_SEC = float(os.getenv("LOG_FLUSH_WINDOW_SEC") or 0.2)
+LOG_FLUSH_MAX_ROWS = int(os.getenv("LOG_FLUSH_MAX_ROWS") or 100)
+
+class LogWriteQueue:
+    def __init__(self, window_sec: float, max_rows: int):
+        self.window_sec = window_sec
+        self.max_rows = max_rows
+        self._cond = threading.Condition()
+        self._pending = []  # [(row, Future)]
+        self._closed = False
+        self._thread = None
+
+    def submit(self, row: list) -> Future:
+        fut = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("종료 중이라 기록할 수 없습니다.")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="logs-writer", daemon=True)
+                self._thread.start()
+            self._pending.append((row, fut))
+            self._cond.notify()
+        return fut
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return None
+            # 첫 행 도착 후 window 동안 더 모은다 (가득 차거나 종료 중이면 즉시)
+            deadline = time.monotonic() + self.window_sec
+            while len(self._pending) < self.max_rows and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_rows]
+            self._pending = self._pending[self.max_rows:]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            write_log_rows([row for row, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+        for _, fut in batch:
+            fut.set_result(None)
+
+    def close(self, timeout: float = 30.0):
+        """남은 행을 모두 기록하고 종료."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            th = self._thread
+        if th is not None:
+            th.join(timeout)
+
+LOG_QUEUE = LogWriteQueue(LOG_FLUSH_WINDOW_SEC, LOG_FLUSH_MAX_ROWS)
+atexit.register(LOG_QUEUE.close)
+
+# --- logs에 행 추가 + 저장소 반영 (쓰기 큐와 저널 단건 재전송이 함께 씀) ---
+def write_log_rows(rows: list):
     ws = get_ws("logs")
+    resp = with_retry(lambda: ws.append_rows(rows, value_input_option="USER_ENTERED"))
+    try:
+        LOGS_STORE.appended(rows, ((resp or {}).get("updates") or {}).get("updatedRange"))
+    except Exception:
+        LOGS_STORE.invalidate()  # 다음 조회에서 전체 재로드
+
+# --- logs 한 행 구성 ---
+def log_row(user_key, user_name, type_, note="", date_str="", by_user=None) -> list:
     now = dt.datetime.now(KST).isoformat(timespec="seconds")
-    row = [
+    return [
         now,
         user_key,
         user_name or "",
@@ -236,67 +1893,278 @@ def append_log(user_key, user_name, type_, note="", date_str="", by_user=None):
         "auto",
         by_user or user_key,
     ]
-    with_retry(lambda: ws.append_row(row, value_input_option="USER_ENTERED"))
 
-# --- 오늘 이미 기록했는지 검사 ---
-def already_logged(user_key: str, type_: str, date_str: str, note_tag: str | None = None, alt_user_key: str | None = None) -> bool:
-    ws = get_ws("logs")
-    vals = ws.get_all_values()
-    if not vals:
-        return False
+# --- 로그 기록 추가 (큐에 넣고 Future 반환) ---
+def append_log_async(user_key, user_name, type_, note="", date_str="", by_user=None) -> Future:
+    return LOG_QUEUE.submit(log_row(user_key, user_name, type_, note=note, date_str=date_str, by_user=by_user))
 
-    head = [h.strip().lower() for h in vals[0]]
-    idx = {h: i for i, h in enumerate(head)}
-    iu = idx.get("user_key") or idx.get("user_id")
-    it = idx.get("type")
-    idate = idx.get("date")
-    inote = idx.get("note")
-    if iu is None or it is None or idate is None:
+# --- 로그 기록 추가 ---
+def append_log(user_key, user_name, type_, note="", date_str="", by_user=None):
+    append_log_async(user_key, user_name, type_, note=note, date_str=date_str, by_user=by_user).result()
+
+# =========================================================
+# 로컬 기록 저널 (write-ahead)
+# ---------------------------------------------------------
+# guard_and_append는 행을 먼저 LOG_JOURNAL_PATH에 한 줄(JSON)로 쓰고 fsync한 뒤 바로 응답한다.
+# 시트 반영은 쓰기 큐가 하고, 실패한 행은 재생 스레드가 시트가 살아나면 다시 보낸다.
+#   {"id": ..., "row": [...]}   기록
+#   {"done": [id, ...]}          시트 반영 완료
+# 재시작 시 done이 없는 항목은 (timestamp, user_key, type, note, date)로 시트에 이미 있는지 확인 후 재생 → 중복 없음.
+# 실패한 행은 항목별로 지수 백오프(LOG_REPLAY_SEC × 2^n, 최대 LOG_REPLAY_MAX_BACKOFF_SEC)를 두고 다시 보낸다.
+# 4xx처럼 다시 보내도 안 되는 오류는 같은 배치의 다른 행까지 함께 실패하므로, 그 행들은 한 건씩 따로 보내 보고
+# 혼자서도 거부된 행만 LOG_DEADLETTER_PATH로 옮긴다.
+# LOG_JOURNAL_PATH를 비우면 저널 없이 시트에 직접 기록한다.
+# =========================================================
+LOG_JOURNAL_PATH = os.getenv("LOG_JOURNAL_PATH", "logs_journal.jsonl")
+LOG_REPLAY_SEC = float(os.getenv("LOG_REPLAY_SEC") or 5)
+LOG_REPLAY_MAX_BACKOFF_SEC = float(os.getenv("LOG_REPLAY_MAX_BACKOFF_SEC") or 300)
+LOG_DEADLETTER_PATH = os.getenv("LOG_DEADLETTER_PATH") or (
+    os.path.splitext(LOG_JOURNAL_PATH)[0] + ".dead.jsonl" if LOG_JOURNAL_PATH else "")
+
+# --- 저널 행과 시트 행 대조 키 (같은 초에 찍힌 기간 등록 행도 날짜/구분으로 갈린다) ---
+def journal_key(ts, user_key, type_, note, date_str) -> tuple:
+    return ((ts or "").strip(), (user_key or "").strip().lower(), (type_ or "").strip().lower(),
+            (note or "").strip(), (date_str or "").strip())
+
+# --- 다시 보내도 소용없는 오류 (시트가 요청 자체를 거부) ---
+def is_rejected_write(e: BaseException) -> bool:
+    if isinstance(e, SheetsUnavailable) or RetryPolicy.classify(e)[0]:
         return False
+    code = getattr(getattr(e, "response", None), "status_code", None)
+    return isinstance(e, APIError) and code is not None and 400 <= code < 500 and code not in (401, 403, 404)
+
+class LogJournal:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = {}      # id -> row (기록 순서 유지)
+        self._sending = set()   # 쓰기 큐에 올라가 있는 id
+        self._recovered = set() # 재시작 전부터 남은 id (시트에 이미 들어갔을 수 있음)
+        self._retry = {}        # id -> (실패 횟수, 다음 시도 시각 monotonic)
+        self._solo = set()      # 배치가 거부돼 한 건씩 보내 볼 id
+        self._wake = threading.Event()
+        self._load()
+        self._fh = open(path, "a", encoding="utf-8")
+        self._thread = None
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # 쓰다 만 마지막 줄
+                if "row" in rec:
+                    self._pending[rec["id"]] = rec["row"]
+                for i in rec.get("done", ()):
+                    self._pending.pop(i, None)
+        self._recovered = set(self._pending)
+
+    def _write(self, rec: dict):
+        self._fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def record(self, row: list) -> str:
+        """행을 디스크에 남기고 id 반환. 반환 시점부터 유실되지 않는다."""
+        jid = uuid.uuid4().hex
+        with self._lock:
+            self._write({"id": jid, "row": row})
+            self._pending[jid] = row
+        return jid
+
+    def mark_done(self, ids: list):
+        with self._lock:
+            ids = [i for i in ids if i in self._pending]
+            if not ids:
+                return
+            for i in ids:
+                self._pending.pop(i, None)
+                self._sending.discard(i)
+                self._recovered.discard(i)
+                self._retry.pop(i, None)
+                self._solo.discard(i)
+            if self._pending:
+                self._write({"done": ids})
+            else:
+                # 전부 반영됨 → 파일 비우기
+                self._fh.seek(0)
+                self._fh.truncate()
+                self._fh.flush()
+                os.fsync(self._fh.fileno())
+
+    def count(self, user_key: str, type_: str, date_str: str, period: str | None = None,
+              alt_user_key: str | None = None) -> int:
+        """아직 시트에 없는 행 중 조건에 맞는 수 (중복 검사용)."""
+        keys = {(k or "").strip().lower() for k in (user_key, alt_user_key) if k}
+        with self._lock:
+            rows = list(self._pending.values())
+        return sum(1 for r in rows
+                   if (r[1] or "").strip().lower() in keys and (r[3] or "").strip().lower() == type_
+                   and (r[5] or "").strip() == date_str
+                   and (period is None or half_period_of(r[4]) == period))
+
+    def pending_leave_rows(self) -> list:
+        """아직 done이 아닌 연차/반차 행 [(정규화 user_key, ordinal, LogType, HALF_CODES)]."""
+        with self._lock:
+            rows = list(self._pending.values())
+        out = []
+        for r in rows:
+            t = LOG_TYPE_CODES.get((r[3] or "").strip().lower(), LogType.OTHER)
+            if t in (LogType.ANNUAL, LogType.HALFDAY):
+                out.append(((r[1] or "").strip().lower(), ymd_ordinal(r[5]), t, HALF_CODES[half_period_of(r[4])]))
+        return out
+
+    # --- 시트 반영 ---
+    def send(self, jid: str, row: list) -> Future:
+        with self._lock:
+            self._sending.add(jid)
+        fut = LOG_QUEUE.submit(row)
+
+        def _done(f):
+            if f.exception() is None:
+                self.mark_done([jid])
+            else:
+                self._failed(jid, f.exception(), solo=False)
+        fut.add_done_callback(_done)
+        return fut
+
+    def _failed(self, jid: str, e: BaseException, solo: bool):
+        """실패 기록 + 백오프. 혼자 보내서도 거부된 행은 dead-letter로."""
+        if solo and is_rejected_write(e):
+            return self._dead_letter(jid, e)
+        with self._lock:
+            self._sending.discard(jid)
+            n = self._retry.get(jid, (0, 0.0))[0] + 1
+            delay = min(LOG_REPLAY_MAX_BACKOFF_SEC, LOG_REPLAY_SEC * (2 ** (n - 1)))
+            self._retry[jid] = (n, time.monotonic() + random.uniform(delay / 2, delay))
+            if is_rejected_write(e):
+                self._solo.add(jid)
+
+    def _dead_letter(self, jid: str, e: BaseException):
+        with self._lock:
+            row = self._pending.get(jid)
+        if row is None:
+            return
+        if LOG_DEADLETTER_PATH:
+            with open(LOG_DEADLETTER_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"id": jid, "row": row, "error": str(e)}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        app.logger.error(f"logs row rejected, moved to dead-letter: {row} ({e})")
+        self.mark_done([jid])
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._replay_loop, name="logs-journal", daemon=True)
+            self._thread.start()
+
+    def _replay_loop(self):
+        while True:
+            self._wake.wait(LOG_REPLAY_SEC)
+            self._wake.clear()
+            try:
+                self.replay()
+            except Exception:
+                pass  # 다음 주기에 다시
+
+    def replay(self):
+        """
+        전송 중이 아니고 백오프가 끝난 행을 배치로 다시 보낸다. 브레이커가 열려 있으면 건너뜀.
+        배치가 거부됐던 행은 한 건씩 직접 보내 문제 행만 가려낸다.
+        """
+        if SHEETS_BREAKER.retry_in() > 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            todo = [(i, r) for i, r in self._pending.items()
+                    if i not in self._sending and self._retry.get(i, (0, 0.0))[1] <= now]
+            if len(todo) > LOG_FLUSH_MAX_ROWS:
+                todo = todo[:LOG_FLUSH_MAX_ROWS]
+                self._wake.set()  # 나머지는 바로 다음 차례에
+            recovered = {i for i, _ in todo if i in self._recovered}
+        if not todo:
+            return
+        if recovered:
+            # 재시작 직전에 시트 반영 후 done을 못 쓴 행은 건너뛴다
+            want = {journal_key(r[0], r[1], r[3], r[4], r[5]): i for i, r in todo if i in recovered}
+            stream = SheetStream("logs", ("timestamp", "user_key", "type", "note", "date"))
+            c = stream.col
+            if all(k in c for k in ("timestamp", "user_key", "type", "note", "date")):
+                already = {want[k] for k in (journal_key(r[c["timestamp"]], r[c["user_key"]], r[c["type"]],
+                                                         r[c["note"]], r[c["date"]]) for _, r in stream.rows())
+                           if k in want}
+                self.mark_done(list(already))
+                todo = [(i, r) for i, r in todo if i not in already]
+            with self._lock:
+                self._recovered.difference_update(recovered)
+        with self._lock:
+            solo = [(i, r) for i, r in todo if i in self._solo]
+            solo_ids = {i for i, _ in solo}
+            self._sending.update(solo_ids)
+        for jid, row in solo:
+            try:
+                write_log_rows([row])
+            except Exception as e:
+                self._failed(jid, e, solo=True)
+            else:
+                self.mark_done([jid])
+        for jid, row in todo:
+            if jid not in solo_ids:
+                self.send(jid, row)
+
+LOG_JOURNAL = LogJournal(LOG_JOURNAL_PATH) if LOG_JOURNAL_PATH else None
+if LOG_JOURNAL is not None:
+    LOG_JOURNAL.start()
+    if LOG_JOURNAL._pending:
+        LOG_JOURNAL._wake.set()
+
+# --- 저널에만 있는 행 수 (저널 미사용 시 0) ---
+def journal_count(user_key, type_, date_str, period=None, alt_user_key=None) -> int:
+    if LOG_JOURNAL is None:
+        return 0
+    return LOG_JOURNAL.count(user_key, type_, date_str, period=period, alt_user_key=alt_user_key)
+
+# --- 저널에만 있는 연차/반차 행 [(정규화 user_key, ordinal, LogType)] ---
+# 시트에 반영돼 스냅샷에 들어갔지만 아직 done이 아닌 행(반영 직후, 재시작 복구분)은
+# 같은 (사용자, 날짜, 종류, 오전/오후) 행이 스냅샷에 있는 만큼 빼서 두 번 세지 않는다.
+# pending을 스냅샷보다 먼저 읽어 넘기면 그 사이 반영+done 된 행도 빠짐없이 어느 한쪽에 잡힌다.
+def journal_leave_rows(snap: LogsSnapshot, pending: list | None = None) -> list:
+    if LOG_JOURNAL is None:
+        return []
+    c, out, seen, in_snap = snap.columns, [], Counter(), {}
+    for k in (LOG_JOURNAL.pending_leave_rows() if pending is None else pending):
+        u, o, t, h = k
+        if k not in in_snap:
+            in_snap[k] = sum(1 for i in snap.user_rows(u) if c.date[i] == o and c.type[i] == t and c.half[i] == h)
+        seen[k] += 1
+        if seen[k] > in_snap[k]:
+            out.append((u, o, t))
+    return out
 
-    # --- 정규화 ---
+# --- 오늘 이미 기록했는지 검사 ---
+def already_logged(user_key: str, type_: str, date_str: str, note_tag: str | None = None, alt_user_key: str | None = None,
+                   *, snap: LogsSnapshot | None = None) -> bool:
+    # 반차는 오전/오후까지 동일해야 중복
     want_type = (type_ or "").strip().lower()
-    want_date = (date_str or "").strip()
-    uk_primary = (user_key or "").strip().lower()
-    uk_alt = (alt_user_key or "").strip().lower()
-    def is_same_user(cell: str) -> bool:
-        v = (cell or "").strip().lower()
-        return v == uk_primary or (uk_alt and v == uk_alt)
-
-    for r in vals[1:]:
-        if iu >= len(r) or it >= len(r) or idate >= len(r):
-            continue
-        if not is_same_user(r[iu]):
-            continue
-        if (r[it] or "").strip().lower() != want_type:
-            continue
-        if (r[idate] or "").strip() != want_date:
-            continue
-
-        # 반차는 오전/오후까지 동일해야 중복
-        if want_type == "halfday" and note_tag:
-            if inote is None or inote >= len(r):
-                continue
-            note = r[inote] or ""
-            if note_tag == "am" and "(오전)" in note:
-                return True
-            if note_tag == "pm" and "(오후)" in note:
-                return True
-            continue
-
-        return True
-
-    return False
+    period = note_tag if (want_type == "halfday" and note_tag) else None
+    src = snap or LOGS_STORE
+    return (src.count(user_key, want_type, date_str, period=period, alt_user_key=alt_user_key)
+            + journal_count(user_key, want_type, date_str, period=period, alt_user_key=alt_user_key)) > 0
 
 
 # --- idempotency key 생성 ---
-def idemp_key(user_key: str, type_: str, date_str: str) -> str:
-    # date_str 없으면 오늘
-    return f"{(user_key or '').strip().lower()}|{type_.lower()}|{date_str}"
+def idemp_key(user_key: str, type_: str, date_str: str, note_tag: str | None = None) -> str:
+    # date_str 없으면 오늘. 반차는 오전/오후(note_tag)가 다르면 다른 요청
+    return f"{(user_key or '').strip().lower()}|{type_.lower()}|{date_str}|{note_tag or ''}"
 
 # --- 중복 처리 방지 및 일일 1회 제한 적용 후 기록 추가 ---
 def guard_and_append(user_key, user_name, type_, note="", date_str="", by_user=None, note_tag=None,
-                     alt_user_key: str | None = None, *, is_admin: bool = False):
+                     alt_user_key: str | None = None, *, is_admin: bool = False,
+                     snap: LogsSnapshot | None = None, wait: bool = True):
+    """wait=False면 기록 Future를 바로 반환 (기간 입력에서 여러 날을 한 번에 flush)."""
     ds = (date_str or today_kst_ymd()).strip()
     t  = (type_ or "").strip().lower()
 
@@ -306,43 +2174,64 @@ def guard_and_append(user_key, user_name, type_, note="", date_str="", by_user=N
             if is_past_ymd(ds):
                 raise RuntimeError("지난 날짜에는 등록할 수 없습니다.")
 
-    key = idemp_key(user_key, t, ds)
-    
-    with _inflight_lock:
-        if key in _inflight:
-            raise RuntimeError("중복 처리 중입니다. 잠시 후 다시 시도하세요.")
-        _inflight.add(key)
+    key = idemp_key(user_key, t, ds, note_tag if t == "halfday" else None)
+    sig = (user_name, (note or "").strip(), by_user)
+    while True:
+        leader, shared, same = APPEND_FLIGHT.begin(key, sig)
+        if leader:
+            break
+        if same:
+            # 같은 요청(더블클릭/재시도)이 처리 중 → 그 결과를 그대로 받는다
+            return shared.result() if wait else shared
+        # 같은 키에 내용이 다른 요청 → 선두가 끝난 뒤 중복 검사부터 다시
+        futures_wait([shared])
 
     try:
-        # 기본 중복 규칙
-        if t in ("checkin", "checkout") and already_logged(user_key, t, ds, alt_user_key=alt_user_key):
+        # 기본 중복 규칙 (snap이 있으면 요청 스냅샷 기준)
+        if t in ("checkin", "checkout") and already_logged(user_key, t, ds, alt_user_key=alt_user_key, snap=snap):
             raise RuntimeError(f"이미 오늘 {t} 기록이 있습니다.")
-        if t == "annual" and already_logged(user_key, "annual", ds, alt_user_key=alt_user_key):
+        if t == "annual" and already_logged(user_key, "annual", ds, alt_user_key=alt_user_key, snap=snap):
             raise RuntimeError("이미 해당 날짜에 연차 기록이 있습니다.")
-        if t == "halfday" and already_logged(user_key, "halfday", ds, note_tag=note_tag, alt_user_key=alt_user_key):
+        if t == "halfday" and already_logged(user_key, "halfday", ds, note_tag=note_tag, alt_user_key=alt_user_key, snap=snap):
             tag_txt = "오전" if note_tag == "am" else "오후"
             raise RuntimeError(f"이미 해당 날짜 {tag_txt} 반차 기록이 있습니다.")
-        if t == "off" and already_logged(user_key, "off", ds, alt_user_key=alt_user_key):
+        if t == "off" and already_logged(user_key, "off", ds, alt_user_key=alt_user_key, snap=snap):
             raise RuntimeError("이미 해당 날짜에 휴무 기록이 있습니다.")
 
         # --- 상호배타 규칙 추가 ---
         if t == "halfday":
             # 그 날짜에 '연차'가 이미 있으면 반차 금지
-            if already_logged(user_key, "annual", ds, alt_user_key=alt_user_key):
+            if already_logged(user_key, "annual", ds, alt_user_key=alt_user_key, snap=snap):
                 raise RuntimeError("해당 날짜에 이미 연차가 있어 반차를 등록할 수 없습니다.")
         if t == "annual":
             # 그 날짜에 반차(오전/오후 중 하나라도)가 있으면 연차 금지
-            if any_halfday_on_date(user_key, ds, alt_user_key=alt_user_key):
+            if any_halfday_on_date(user_key, ds, alt_user_key=alt_user_key, snap=snap):
                 raise RuntimeError("해당 날짜에 이미 반차가 있어 연차를 등록할 수 없습니다.")
 
-        def _do():
-            return append_log(user_key, user_name, t, note=note, date_str=ds, by_user=by_user)
+        if LOG_JOURNAL is not None:
+            # 디스크에 남긴 순간 기록 완료. 시트 반영은 뒤에서 (이후 중복 검사는 저널도 본다)
+            row = log_row(user_key, user_name, t, note=note, date_str=ds, by_user=by_user)
+            LOG_JOURNAL.send(LOG_JOURNAL.record(row), row)
+            fut = Future()
+            fut.set_result(None)
+        else:
+            fut = append_log_async(user_key, user_name, t, note=note, date_str=ds, by_user=by_user)
+    except BaseException as e:
+        APPEND_FLIGHT.finish(key, shared, exc=e)
+        raise
 
-        return with_retry(_do)
+    # 기록될 때까지 같은 키는 이 결과를 공유
+    fut.add_done_callback(lambda f: APPEND_FLIGHT.finish(key, shared, src=f))
+    return shared.result() if wait else shared
 
-    finally:
-        with _inflight_lock:
-            _inflight.discard(key)
+# --- wait=False로 모은 기록 결과 수집 ---
+def collect_appends(pending: list, saved: list, failed: list):
+    for ds, fut in pending:
+        try:
+            fut.result()
+            saved.append(ds)
+        except Exception as e:
+            failed.append((ds, human_error(e)))
 
 
 # --- 중복 기록 검사 및 메시지 생성 ---
@@ -379,9 +2268,9 @@ def ensure_admin_requests_sheet() -> tuple:
         ws = get_ws("admin_requests")
     except Exception:
         # 없으면 생성
-        sh = get_sh()
         try:
             ws = with_retry(lambda: sh.add_worksheet(title="admin_requests", rows=1000, cols=10))
+            WS_REGISTRY.invalidate()
         except Exception:
             # 동시 생성 경합 대비 재시도
             ws = get_ws("admin_requests")
@@ -542,6 +2431,7 @@ def 근태_action_change(ack, body, client):
     
 # ---------- 제출 처리 ----------
 @app.view("attendance_submit")
+@post_ack(Lane.LEAVE)
 def 근태_submit(ack, body, view, client, logger):
     acked = False
     def ack_errors(errors: dict):
@@ -634,9 +2524,9 @@ def 근태_submit(ack, body, view, client, logger):
                             errors["date_start_b"] = "지난 날짜가 포함되어 있습니다. 오늘 이후로만 선택하세요."
                     
         # 시트 존재
-        missing = [n for n in ("logs","balances","schedule_weekly","holidays") if not sheet_exists(n)]
+        missing = require_sheets_or_error()
         if missing:
-            errors["action_b"] = "시트가 없습니다: " + ", ".join(missing)
+            errors["action_b"] = missing
         if errors: return ack_errors(errors)
 
         # 4) 여기서 즉시 ACK (이후 I/O OK)
@@ -649,13 +2539,22 @@ def 근태_submit(ack, body, view, client, logger):
 
         saved, failed, skips = [], [], []
 
+        # logs는 제출 1건당 1회만 읽고 아래 검사/잔여 계산이 공유
+        # 연차는 잔여 확인용 balances(+ holidays)까지 같은 values_batch_get으로 받는다
+        try:
+            bal_vals = batch_read(READS_BALANCE)["balances"] if action == "annual" else None
+            snap = take_logs_snapshot()
+        except Exception as e:
+            client.chat_postEphemeral(channel=uid, user=uid, text=human_error(e))
+            return
+
         if action == "halfday":
             ds = date_start
             note_final = note + (" (오전)" if half_period=="am" else " (오후)")
             try:
                 guard_and_append(ukey, uname, "halfday",
                     note=note_final, date_str=ds, by_user=ukey,
-                    note_tag=half_period, alt_user_key=uid)
+                    note_tag=half_period, alt_user_key=uid, snap=snap)
                 saved.append(ds)
             except Exception as e:
                 failed.append((ds, human_error(e)))
@@ -663,9 +2562,9 @@ def 근태_submit(ack, body, view, client, logger):
         elif action == "annual":
             # 잔여·스킵 계산은 ACK 이후 수행 → 초과면 에페메럴로만 안내하고 종료
             try:
-                savables, skips = resolve_annual_savables(ukey, date_start, date_end or date_start, alt_user_key=uid)
+                savables, skips = resolve_annual_savables(ukey, date_start, date_end or date_start, alt_user_key=uid, snap=snap)
                 need_days = len(savables)
-                current_left = update_balance_for_user(ukey, uname)
+                current_left = balance_for_user(ukey, uname, bal_vals).left
             except Exception as e:
                 client.chat_postEphemeral(channel=uid, user=uid, text="잔여/시트 계산 중 오류가 발생했습니다. 잠시 후 다시 시도해주세요.")
                 return
@@ -677,28 +2576,30 @@ def 근태_submit(ack, body, view, client, logger):
                 client.chat_postEphemeral(channel=uid, user=uid, text=msg)
                 return
 
-            # 기록
+            # 기록 (전체 기간을 큐에 넣고 한 번에 결과 수집)
+            pending = []
             for ds in savables:
                 try:
-                    guard_and_append(ukey, uname, "annual",
-                        note=note, date_str=ds, by_user=ukey, alt_user_key=uid)
-                    saved.append(ds)
+                    pending.append((ds, guard_and_append(ukey, uname, "annual",
+                        note=note, date_str=ds, by_user=ukey, alt_user_key=uid, snap=snap, wait=False)))
                 except Exception as e:
                     failed.append((ds, human_error(e)))
+            collect_appends(pending, saved, failed)
 
         elif action == "off":
+            pending = []
             for ds in iter_dates(date_start, date_end or date_start):
                 try:
-                    guard_and_append(ukey, uname, "off",
-                        note=note, date_str=ds, by_user=ukey, alt_user_key=uid)
-                    saved.append(ds)
+                    pending.append((ds, guard_and_append(ukey, uname, "off",
+                        note=note, date_str=ds, by_user=ukey, alt_user_key=uid, snap=snap, wait=False)))
                 except Exception as e:
                     failed.append((ds, human_error(e)))
+            collect_appends(pending, saved, failed)
         else:
             ds = date_start or today_kst_ymd()
             try:
                 guard_and_append(ukey, uname, action,
-                    note=note, date_str=ds, by_user=ukey, alt_user_key=uid)
+                    note=note, date_str=ds, by_user=ukey, alt_user_key=uid, snap=snap)
                 saved.append(ds)
             except Exception as e:
                 failed.append((ds, human_error(e)))
@@ -874,6 +2775,7 @@ def admin_action_change(ack, body, client):
     
 # --- 제출: admin_attendance_submit ---
 @app.view("admin_attendance_submit")
+@post_ack(Lane.ADMIN)
 def admin_submit(ack, body, view, client, logger):
     acked = False
     def ack_errors(errors):
@@ -941,9 +2843,9 @@ def admin_submit(ack, body, view, client, logger):
                 errors["date_start_b"]="지난 날짜가 포함되어 있습니다."
                 
     # 시트 존재
-    miss=[n for n in ("logs","balances","schedule_weekly","holidays") if not sheet_exists(n)]
+    miss=require_sheets_or_error()
     if miss: 
-        errors["action_b"]="시트가 없습니다: "+", ".join(miss)
+        errors["action_b"]=miss
     if errors: 
         return ack_errors(errors)
 
@@ -972,35 +2874,40 @@ def admin_submit(ack, body, view, client, logger):
     }
 
     try:
+        # logs는 제출 1건당 1회만 읽는다
+        snap = take_logs_snapshot()
+
         if action=="halfday":
             ds = date_start
             note_final = note + (" (오전)" if half_period=="am" else " (오후)")
             guard_and_append(target_key, target_name, "halfday",
                              note=note_final, date_str=ds, by_user=admin_key,
-                             note_tag=half_period, alt_user_key=target_uid, is_admin=True)
+                             note_tag=half_period, alt_user_key=target_uid, is_admin=True, snap=snap)
             saved.append(ds)
 
         elif action=="annual":
             if not date_end: date_end = date_start
             dates = [d for d in iter_dates(date_start, date_end) if is_business_day(parse_ymd_safe(d))]
+            pending = []
             for ds in dates:
                 try:
-                    guard_and_append(target_key, target_name, "annual",
+                    pending.append((ds, guard_and_append(target_key, target_name, "annual",
                                      note=note, date_str=ds, by_user=admin_key,
-                                     alt_user_key=target_uid, is_admin=True)
-                    saved.append(ds)
+                                     alt_user_key=target_uid, is_admin=True, snap=snap, wait=False)))
                 except Exception as e:
                     failed.append((ds, human_error(e)))
+            collect_appends(pending, saved, failed)
 
         elif action=="off":
+            pending = []
             for ds in iter_dates(date_start, date_end or date_start):
                 try:
-                    guard_and_append(target_key, target_name, "off",
+                    pending.append((ds, guard_and_append(target_key, target_name, "off",
                                      note=note, date_str=ds, by_user=admin_key,
-                                     alt_user_key=target_uid, is_admin=True)
-                    saved.append(ds)
+                                     alt_user_key=target_uid, is_admin=True, snap=snap, wait=False)))
                 except Exception as e:
                     failed.append((ds, human_error(e)))
+            collect_appends(pending, saved, failed)
 
     except Exception as e:
         # 처리 중 치명 예외 → 실패 로깅
@@ -1054,189 +2961,201 @@ def to_float(v, default=0.0):
     except Exception:
         return default
 
-def logs_usage_since(user_key: str, since_date: dt.date | None = None, year: int | None = None):
-    ws = get_ws("logs")
-    vals = ws.get_all_values()
-    if not vals:
-        return 0.0, 0.0
-
-    head = [h.strip().lower() for h in vals[0]]
-    idx = {h: i for i, h in enumerate(head)}
-    iu = idx.get("user_key") or idx.get("user_id")
-    it = idx.get("type")
-    idate = idx.get("date")
-    if iu is None or it is None or idate is None:
-        return 0.0, 0.0
-
-    target = (user_key or "").strip().lower()
-    dates_annual = set()
-    half_count = {}
-
-    def ok_date(d: dt.date) -> bool:
-        if since_date and d < since_date:
-            return False
-        if year and d.year != year:
-            return False
-        # 평일/휴일 필터 (원한다면 사업일만 차감)
-        return is_business_day(d)
-
-    # 1차 스캔: 연차 날짜 수집
-    for r in vals[1:]:
-        if iu >= len(r) or it >= len(r) or idate >= len(r):
-            continue
-        uk = (r[iu] or "").strip().lower()
-        if uk != target:
-            continue
-        t = (r[it] or "").strip().lower()
-        d = parse_ymd_safe((r[idate] or "").strip())
-        if not d or not ok_date(d):
-            continue
-        if t == "annual":
-            dates_annual.add(d.isoformat())
-
-    # 2차 스캔: 반차 카운트 (단, 같은 날 연차 있으면 무시)
-    for r in vals[1:]:
-        if iu >= len(r) or it >= len(r) or idate >= len(r):
-            continue
-        uk = (r[iu] or "").strip().lower()
-        if uk != target:
-            continue
-        t = (r[it] or "").strip().lower()
-        d = parse_ymd_safe((r[idate] or "").strip())
-        if not d or not ok_date(d):
-            continue
-        if t == "halfday" and d.isoformat() not in dates_annual:
-            half_count[d.isoformat()] = half_count.get(d.isoformat(), 0) + 1
+BALANCES_HEADER = ["user_key","user_name","annual_total","annual_used","annual_left",
+                   "half_used","override_left","override_from","last_admin_update","notes"]
 
-    annual_used = float(len(dates_annual))
-    # 같은 날 반차 2개라도 1.0까지만 인정
-    half_used = 0.0
-    for _, c in half_count.items():
-        half_used += min(1.0, 0.5 * c)
-
-    return annual_used, half_used
-
-def get_or_create_balance_row(ukey: str, uname: str):
+# --- balances에서 사용자 행 읽기 (쓰기 없음) ---
+def read_balance_row(ukey: str, vals: list | None = None) -> tuple:
     """
-    balances에서 user_key 행을 찾고 없으면 생성.
-    (rownum, row_values, head_list, col_index_map) 반환.
+    (rownum 또는 None, 소문자 헤더, 행 값). 행이 없으면 (None, head, []).
+    vals(balances 전체)가 없으면 READS_BALANCE 묶음으로 읽는다 (logs 동기화·holidays 포함 1회).
     """
-    ws = get_ws("balances")
-    vals = ws.get_all_values()
-
-    # 헤더 없으면 생성
-    if not vals:
-        ws.append_row(
-            ["user_key","user_name","annual_total","annual_used","annual_left",
-             "half_used","override_left","override_from","last_admin_update","notes"],
-            value_input_option="USER_ENTERED",
-        )
-        vals = ws.get_all_values()
-
-    head = [h.strip().lower() for h in vals[0]]
-    col = {h: i for i, h in enumerate(head)}
-
-    # 필수 컬럼 없으면 그대로 둔다 (호출 전에 시트 맞춰둘 것)
-    if "user_key" not in col or "user_name" not in col:
-        raise RuntimeError("balances 시트 헤더(user_key,user_name)가 올바르지 않습니다.")
-
+    if vals is None:
+        vals = batch_read(READS_BALANCE)["balances"]
+    head = [h.strip().lower() for h in vals[0]] if vals else []
+    iu = head.index("user_key") if "user_key" in head else None
     target = (ukey or "").strip().lower()
-    rownum = None
-    row = None
-
-    for rn, r in enumerate(vals[1:], start=2):
-        key = (r[col["user_key"]] if col["user_key"] < len(r) else "").strip().lower()
-        if key == target:
-            rownum = rn
-            row = r
-            break
-
-    if rownum is None:
-        # 새 행 스켈레톤
-        rownum = len(vals) + 1
-        new_row = [""] * len(head)
-        new_row[col["user_key"]] = ukey
-        new_row[col["user_name"]] = uname
-        ws.append_row(new_row, value_input_option="USER_ENTERED")
-        vals = ws.get_all_values()
-        row = vals[rownum - 1]
-
-    return ws, rownum, row, head, col
-
-
-def update_balance_for_user(ukey: str, uname: str) -> float:
+    if iu is not None:
+        for rn, r in enumerate(vals[1:], start=2):
+            if iu < len(r) and (r[iu] or "").strip().lower() == target:
+                return rn, head, r
+    return None, head, []
+
+# --- 잔여 계산 결과 ---
+class BalanceResult:
+    """한 사용자의 잔여 계산값과 계산 기준 (balances 원문 포함)."""
+
+    def __init__(self, user_key: str, bal: dict, used: float, half: float, left: float):
+        self.user_key = user_key
+        self.bal = bal                # balances 행 {소문자 헤더: 값}
+        self.used = used              # 사용한 연차(일)
+        self.half = half              # 사용한 반차(일)
+        self.left = left              # 남은 연차(일)
+        self.total = str(bal.get("annual_total") or "").strip()
+        self.override_left = str(bal.get("override_left") or "").strip()
+        self.override_from = str(bal.get("override_from") or "").strip()
+
+    @property
+    def basis(self) -> str:
+        """잔여 계산 기준 설명."""
+        if self.override_left != "":
+            return (f"(관리자 기준선 {self.override_left}일"
+                    + (f", 기준일 {self.override_from}" if self.override_from else "") + ")")
+        if self.total != "":
+            return f"(연차 총 {self.total}일)"
+        return ""
+
+# --- 잔여 계산 (순수 계산, 시트 접근 없음) ---
+def compute_balance(ukey: str, bal: dict) -> BalanceResult:
     """
-    1) balances에 해당 user_key 행 생성 또는 로드
-    2) override_left가 있으면:
-         override_from 이후 logs 사용량만 차감
-       없으면:
-         annual_total 기준, 해당 연도 logs 사용량 차감
-    3) annual_used, half_used, annual_left, last_admin_update 업데이트
-    4) 최종 잔여일수 반환
+    bal: balances 행 {소문자 헤더: 값}.
+    override_left가 있으면 override_from 이후 사용량만, 없으면 annual_total - 올해 사용량.
     """
-    ws, rownum, row, head, col = get_or_create_balance_row(ukey, uname)
-
-    def get_cell(name: str, default: str = ""):
-        i = col.get(name)
-        if i is None:
-            return default
-        return (row[i] if i < len(row) and row[i] != "" else default)
-
-    now = dt.datetime.now(KST)
-    now_iso = now.isoformat(timespec="seconds")
-
-    # 관리자 기준선 우선
-    o_left_raw = get_cell("override_left", "")
-    o_from_raw = get_cell("override_from", "")
-
-    updates = {
-        "user_key": ukey,
-        "user_name": uname,
-        "last_admin_update": now_iso,
-    }
-
-    if str(o_left_raw).strip() != "":
-        base = to_float(o_left_raw, 0.0)
-        since = parse_ymd_safe(str(o_from_raw)) if o_from_raw else None
-        au, hu = logs_usage_since(ukey, since_date=since)
-        left = max(0.0, base - (au + hu))
-        updates["annual_used"] = f"{au:.1f}"
-        updates["half_used"] = f"{hu:.1f}"
-        updates["annual_left"] = f"{left:.1f}"
-        eff_left = left
+    o_left = str(bal.get("override_left") or "").strip()
+    if o_left != "":
+        o_from = str(bal.get("override_from") or "").strip()
+        au, hu = usage_of(ukey, since=parse_ymd_safe(o_from) if o_from else None)
+        base = to_float(o_left, 0.0)
     else:
-        # annual_total 기반
-        total = to_float(get_cell("annual_total", "0"), 0.0)
-        year = now.year
-        au, hu = logs_usage_since(ukey, year=year)
-        left = max(0.0, total - (au + hu))
-        updates["annual_used"] = f"{au:.1f}"
-        updates["half_used"] = f"{hu:.1f}"
-        updates["annual_left"] = f"{left:.1f}"
-        eff_left = left
-        
-    
-    # 시트 업데이트 (필요 컬럼만)
-    def cell_range(col_index: int) -> str:
-        # 0-based index -> A,B,C...
-        return f"{chr(ord('A') + col_index)}{rownum}:{chr(ord('A') + col_index)}{rownum}"
-
-    def do_updates():
-        data = []
-        for name, val in updates.items():
-            i = col.get(name)
-            if i is None:
+        au, hu = usage_of(ukey, year=dt.datetime.now(KST).year)
+        base = to_float(bal.get("annual_total"), 0.0)
+    return BalanceResult(ukey, bal, au, hu, max(0.0, base - (au + hu)))
+
+# --- balances 계산값 지연 기록 ---
+# 계산값이 시트에 저장된 값과 다를 때만 예약하고, 같은 사용자의 예약은 마지막 값으로 합친다.
+# 첫 예약 후 BALANCE_WRITE_DEBOUNCE_SEC가 지나면 모인 것을 batch_update 한 번(+ 새 사용자는 append_rows 한 번)으로 쓴다.
+# 행 번호는 쓰기 직전에 user_key 열만 읽어 다시 찾는다 (예약 시점의 행 번호는 그 사이 밀렸을 수 있음).
+# 쓰기에 실패하면 묶음을 다시 예약 목록에 합치고(그 사이 들어온 새 값이 우선)
+# BALANCE_WRITE_DEBOUNCE_SEC × 2^n(최대 BALANCE_WRITE_MAX_BACKOFF_SEC) 뒤에 다시 시도한다.
+# 종료 시에는 한 번 더 쓰고, 그래도 실패한 값은 오류 로그로 남긴다.
+BALANCE_WRITE_DEBOUNCE_SEC = float(os.getenv("BALANCE_WRITE_DEBOUNCE_SEC") or 5)
+BALANCE_WRITE_MAX_BACKOFF_SEC = float(os.getenv("BALANCE_WRITE_MAX_BACKOFF_SEC") or 300)
+
+class BalanceWriteBack:
+    def __init__(self, debounce_sec: float):
+        self.debounce_sec = debounce_sec
+        self._pending = {}  # user_key(lower) -> {컬럼: 값}
+        self._lock = threading.Lock()
+        self._timer = None
+        self._fails = 0  # 연속 실패 횟수 (백오프용)
+
+    def schedule(self, ukey: str, values: dict):
+        with self._lock:
+            merged = dict(self._pending.get(ukey.lower()) or {})
+            merged.update(values)
+            self._pending[ukey.lower()] = merged
+            if self._timer is None:
+                self._arm(self.debounce_sec)
+
+    def _arm(self, delay: float):
+        """_lock 안에서 호출."""
+        self._timer = threading.Timer(delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self, retry: bool = True):
+        with self._lock:
+            pending, self._pending, self._timer = self._pending, {}, None
+        if not pending:
+            return
+        try:
+            self._write(pending)
+        except Exception as e:
+            self._requeue(pending, e, retry)
+        else:
+            with self._lock:
+                self._fails = 0
+
+    def _requeue(self, pending: dict, e: BaseException, retry: bool):
+        """실패한 묶음을 되돌린다. 그 사이 다시 예약된 사용자는 새 값이 우선."""
+        with self._lock:
+            for k, values in pending.items():
+                merged = dict(values)
+                merged.update(self._pending.get(k) or {})
+                self._pending[k] = merged
+            self._fails += 1
+            delay = min(BALANCE_WRITE_MAX_BACKOFF_SEC, self.debounce_sec * (2 ** self._fails))
+            if retry:
+                if self._timer is not None:
+                    self._timer.cancel()
+                self._arm(random.uniform(delay / 2, delay))
+            else:
+                left, self._pending = self._pending, {}
+        if retry:
+            app.logger.warning(f"balances write-back failed for {len(pending)} users, retrying in ~{delay:.0f}s: {e}")
+        else:
+            # 종료 시점: 다시 시도할 수 없으니 /잔여재계산 등으로 되살릴 수 있게 값을 남긴다
+            app.logger.error(f"balances write-back dropped at exit ({e}): "
+                             + json.dumps(left, ensure_ascii=False))
+
+    def _write(self, pending: dict):
+        """행 번호는 쓰기 직전에 user_key로 다시 찾는다 (예약 뒤에 행이 끼거나 지워졌을 수 있음)."""
+        stream = SheetStream("balances", ("user_key",))
+        if not stream.head:
+            with_retry(lambda: get_ws("balances").append_rows([BALANCES_HEADER], value_input_option="USER_ENTERED"))
+            stream = SheetStream("balances", ("user_key",))
+        head = SHEET_HEADS["balances"]
+        if "user_key" not in stream.col:
+            raise RuntimeError("balances 헤더에 user_key가 없습니다.")
+        iu = stream.col["user_key"]
+        pos = {}
+        for rn, r in stream.rows():
+            pos.setdefault(r[iu].strip().lower(), rn)
+        col = {h: i for i, h in enumerate(head)}
+        data, new_rows = [], []
+        for k, values in pending.items():
+            rn = pos.get(k)
+            if rn is None:
+                row = [""] * len(head)
+                for name, v in values.items():
+                    if name in col:
+                        row[col[name]] = v
+                new_rows.append(row)
                 continue
-            data.append({
-                "range": cell_range(i),
-                "values": [[val]],
-            })
+            for name, v in values.items():
+                if name in col and name != "user_key":
+                    a1 = f"{col_letter(col[name])}{rn}"
+                    data.append({"range": f"{a1}:{a1}", "values": [[v]]})
+        ws = get_ws("balances")
         if data:
-            ws.batch_update(data, value_input_option="USER_ENTERED")
-
-    with_retry(do_updates)
+            with_retry(lambda: ws.batch_update(data, value_input_option="USER_ENTERED"))
+        if new_rows:
+            with_retry(lambda: ws.append_rows(new_rows, value_input_option="USER_ENTERED"))
+
+    def close(self):
+        with self._lock:
+            t, pending = self._timer, bool(self._pending)
+        if t is not None:
+            t.cancel()
+        if pending:
+            self.flush(retry=False)
+
+BALANCE_WRITES = BalanceWriteBack(BALANCE_WRITE_DEBOUNCE_SEC)
+atexit.register(BALANCE_WRITES.close)
+
+# --- 잔여 조회 + 필요 시 지연 기록 ---
+def balance_for_user(ukey: str, uname: str, bal_vals: list | None = None) -> BalanceResult:
+    """
+    읽기 1회(READS_BALANCE, bal_vals를 받으면 0회), 즉시 쓰기 없음.
+    저장된 annual_used/half_used/annual_left/user_name과 다르면 BALANCE_WRITES로 지연 기록.
+    """
+    rownum, head, row = read_balance_row(ukey, bal_vals)
+    bal = {h: (row[i] if i < len(row) else "") for i, h in enumerate(head)}
+    res = compute_balance(ukey, bal)
+
+    computed = {"annual_used": f"{res.used:.1f}", "half_used": f"{res.half:.1f}", "annual_left": f"{res.left:.1f}"}
+    changed = rownum is None or any(to_float(bal.get(k), None) != to_float(v) for k, v in computed.items())
+    if uname and (bal.get("user_name") or "") != uname:
+        changed = True
+    if changed:
+        values = {"user_key": ukey, "user_name": uname, **computed,
+                  "last_admin_update": dt.datetime.now(KST).isoformat(timespec="seconds")}
+        BALANCE_WRITES.schedule(ukey, values)
+    return res
 
-    return eff_left
+def update_balance_for_user(ukey: str, uname: str) -> float:
+    """잔여일수 반환 (balances 기록은 값이 바뀐 경우에만 지연 반영)."""
+    return balance_for_user(ukey, uname).left
 
 # =========================================================
 # /잔여 : 사용자 잔여 조회 + balances 동기화
@@ -1244,6 +3163,7 @@ def update_balance_for_user(ukey: str, uname: str) -> float:
 
 # ---------- /잔여 커맨드 ----------
 @app.command("/잔여")
+@post_ack(Lane.ADMIN)
 def 잔여_cmd(ack, body, respond, client):
     ack()
     try:
@@ -1251,27 +3171,9 @@ def 잔여_cmd(ack, body, respond, client):
         ukey = safe_user_key(client, uid)
         uname = safe_user_name(client, uid)
 
-        # balances 갱신(annual_used/half_used/annual_left 갱신됨)
-        left = update_balance_for_user(ukey, uname)
-
-        ws = get_ws("balances")
-        vals = ws.get_all_values()
-        head = [h.strip().lower() for h in vals[0]] if vals else []
-        col = {h: i for i, h in enumerate(head)}
-
-        # 대상 행 찾기
-        row = None
-        for r in vals[1:]:
-            if col.get("user_key", 0) < len(r) and (r[col["user_key"]] or "").strip().lower() == ukey.lower():
-                row = r
-                break
-
-        # 안전 추출 유틸
-        def getc(name, default=""):
-            i = col.get(name)
-            if i is None or row is None or i >= len(row):
-                return default
-            return (row[i] or "").strip()
+        with request_deadline(INTERACTIVE_DEADLINE_SEC):
+            # 계산값으로 바로 응답 (balances 기록은 바뀐 경우에만 뒤에서)
+            res = balance_for_user(ukey, uname)
 
         def f1(x):
             try:
@@ -1279,30 +3181,14 @@ def 잔여_cmd(ack, body, respond, client):
             except Exception:
                 return x if x != "" else "-"
 
-        # 값 추출
-        annual_total = getc("annual_total", "")
-        annual_used  = getc("annual_used", "")
-        half_used    = getc("half_used", "")
-        annual_left  = getc("annual_left", "")  # update_balance_for_user가 방금 쓴 값
-        override_left = getc("override_left", "")
-        override_from = getc("override_from", "")
-
-        # 기준 설명
-        if override_left != "":
-            basis = f"(관리자 기준선 {override_left}일" + (f", 기준일 {override_from}" if override_from else "") + ")"
-        elif annual_total != "":
-            basis = f"(연차 총 {annual_total}일)"
-        else:
-            basis = ""
-
         # 출력
         msg = (
             f"*{uname} 님 잔여 요약*\n"
-            f"• 총 연차: {f1(annual_total)}일\n"
-            f"• 사용한 연차: {f1(annual_used)}일\n"
-            f"• 사용한 반차: {f1(half_used)}일\n"
-            f"• 남은 연차: {f1(annual_left if annual_left != '' else left)}일"
-            + (f"\n_{basis}_" if basis else "")
+            f"• 총 연차: {f1(res.total)}일\n"
+            f"• 사용한 연차: {res.used:.1f}일\n"
+            f"• 사용한 반차: {res.half:.1f}일\n"
+            f"• 남은 연차: {res.left:.1f}일"
+            + (f"\n_{res.basis}_" if res.basis else "")
         )
         respond(msg)
 
@@ -1311,7 +3197,7 @@ def 잔여_cmd(ack, body, respond, client):
 
 # --- 잔여일수 행 맵 조회 ---
 def get_balance_row_map():
-    ws = sh.worksheet("balances")
+    ws = get_ws("balances")
     vals = ws.get_all_values()
     if not vals: return ws, {}, []
     head = [h.strip().lower() for h in vals[0]]
@@ -1323,56 +3209,6 @@ def get_balance_row_map():
         if uk: pos[uk] = rn
     return ws, idx, rows, pos
 
-# --- 특정 사용자 잔여일수 계산 ---
-def effective_left_for(user_key: str):
-    ws = sh.worksheet("balances")
-    vals = ws.get_all_values()
-    if not vals: return 0.0
-    head = [h.strip().lower() for h in vals[0]]
-    col = {h:i for i,h in enumerate(head)}
-    rn = None
-    for rnum, r in enumerate(vals[1:], start=2):
-        uk = (r[col.get("user_key",0)] if col.get("user_key",0) < len(r) else "").strip().lower()
-        if uk == (user_key or "").strip().lower():
-            row = r; rn = rnum; break
-    if not rn: return 0.0
-
-    o_left = row[col["override_left"]] if "override_left" in col and col["override_left"] < len(row) else ""
-    o_from = row[col["override_from"]] if "override_from" in col and col["override_from"] < len(row) else ""
-    if str(o_left).strip():
-        base = to_float(o_left, 0.0)
-        since = None
-        try:
-            y,m,d = map(int, str(o_from).split("-"))
-            since = dt.date(y,m,d)
-        except: pass
-        used = logs_usage_since(user_key, since_date=since)  # 기존 함수 사용
-        return max(0.0, base - used)
-
-    # fallback: 연간 계산
-    total = to_float(row[col.get("annual_total","")], 0.0)
-    year = dt.datetime.now(KST).year
-    used = 0.0
-    ws_logs = sh.worksheet("logs")
-    lvals = ws_logs.get_all_values()
-    if lvals:
-        lhead = [h.strip().lower() for h in lvals[0]]
-        iu = lhead.index("user_key") if "user_key" in lhead else lhead.index("user_id")
-        it = lhead.index("type"); idt = lhead.index("date")
-        for r in lvals[1:]:
-            if iu >= len(r) or it >= len(r) or idt >= len(r): continue
-            if (r[iu] or "").strip().lower() != (user_key or "").strip().lower(): continue
-            t = (r[it] or "").strip().lower()
-            try:
-                y,m,d = map(int, (r[idt] or "").split("-"))
-                dd = dt.date(y,m,d)
-            except:
-                continue
-            if dd.year != year: continue
-            used += 1.0 if t=="annual" else (0.5 if t=="halfday" else 0.0)
-    return max(0.0, total - used)
-
-
 # --- 잔여일수 재정의 모달 뷰 빌더 ---
 def build_override_view(initial_left:str="", initial_date:str=""):
     return {
@@ -1391,78 +3227,93 @@ def build_override_view(initial_left:str="", initial_date:str=""):
          "element":{"type":"plain_text_input","action_id":"note"}}
       ]}
 
-# --- 잔여일수 재계산 ---
-def recompute_balances(target_year=None):
+# --- 잔여일수 일괄 재계산 ---
+# logs 스냅샷을 한 번 잡고 balances는 필요한 컬럼만 SheetStream으로 나눠 읽으며, 전원의 annual_used/half_used/annual_left를 계산해
+# 기존 행은 batch_update 한 번, balances에 없는 사용자는 append_rows 한 번으로 쓴다.
+# 규칙은 update_balance_for_user와 같다 (override_left가 있으면 override_from 이후 사용량, 없으면 annual_total - 올해 사용량).
+BALANCE_CALC_COLS = ("annual_used", "annual_left", "half_used")
+
+def recompute_balances(target_year=None) -> dict:
+    """처리 결과 통계(dict) 반환."""
+    t0 = time.monotonic()
     year = target_year or dt.datetime.now(KST).year
-    ws_logs = sh.worksheet("logs")
-    vals = ws_logs.get_all_values()  # A:H
-    if not vals: return
-    head = [h.strip().lower() for h in vals[0]]
-    get = lambda col: head.index(col)
-
-    i_user_key = get("user_id") if "user_id" in head else get("user_key")
-    i_user_name = get("user_name")
-    i_type = get("type")
-    i_date = get("date")
-
-    # 연차/반차 집계
-    used = {}   # user_key -> {'name':..., 'annual':x, 'half':y}
-    for r in vals[1:]:
-        if len(r) <= max(i_user_key,i_user_name,i_type,i_date): continue
-        ukey = (r[i_user_key] or "").strip()
-        if not ukey: continue
-        t = (r[i_type] or "").strip().lower()
-        d = parse_date((r[i_date] or "").strip())
-        # 연차/반차만 집계. 날짜 없으면 올해로 간주하지 않음
-        if t not in ("annual","halfday"): 
+    snap = take_logs_snapshot()
+    c = snap.columns
+    table = usage_table(snap, year=year)
+
+    ws_bal = get_ws("balances")
+    need = ("user_key", "user_name") + BALANCE_CALC_COLS
+    stream = SheetStream("balances", need + ("annual_total", "override_left", "override_from"))
+    if not stream.head:
+        raise RuntimeError("balances 시트에 헤더가 없습니다.")
+    col, off = stream.col, stream.offset
+    if any(n not in col for n in need):
+        raise RuntimeError("balances 헤더 불일치: " + ",".join(need))
+    bwidth = len(SHEET_HEADS["balances"])
+
+    def cell(r, name):
+        i = col.get(name)
+        return (r[i] if i is not None and i < len(r) else "").strip()
+
+    def calc(ukey, r):
+        """(annual_used, half_used, annual_left)"""
+        o_left = cell(r, "override_left") if r else ""
+        if o_left != "":
+            since = parse_ymd_safe(cell(r, "override_from")) if cell(r, "override_from") else None
+            au, hu = usage_of(ukey, since=since, snap=snap)
+            base = to_float(o_left, 0.0)
+        else:
+            if snap.user_id(ukey) is not None:
+                au, hu = table.get(ukey)
+            else:  # logs에 아직 없는 사용자(저널에만 있는 행)
+                au, hu = usage_of(ukey, year=year, snap=snap)
+            base = to_float(cell(r, "annual_total") if r else "", 0.0)
+        return au, hu, max(0.0, base - (au + hu))
+
+    # 기존 행: 계산 컬럼이 걸친 구간만 다시 쓴다 (구간 안 다른 칸은 읽은 값 유지)
+    lo = min(col[n] for n in BALANCE_CALC_COLS)
+    hi = max(col[n] for n in BALANCE_CALC_COLS)
+    data, seen, n_bal = [], set(), 0
+    for rownum, r in stream.rows():
+        n_bal += 1
+        ukey = cell(r, "user_key")
+        if not ukey or ukey.lower() in seen:
             continue
-        if not d or d.year != year:
+        seen.add(ukey.lower())
+        au, hu, left = calc(ukey, r)
+        span = r[lo:hi + 1]
+        span[col["annual_used"] - lo] = f"{au:.1f}"
+        span[col["half_used"] - lo] = f"{hu:.1f}"
+        span[col["annual_left"] - lo] = f"{left:.1f}"
+        data.append({"range": f"{col_letter(off + lo)}{rownum}:{col_letter(off + hi)}{rownum}", "values": [span]})
+    t_read = time.monotonic()
+
+    # logs에만 있는 사용자: 새 행
+    new_rows = []
+    for ukey in list(c.user_keys):
+        rows = snap.user_rows(ukey) if ukey else ()
+        if not rows or ukey.lower() in seen:
             continue
-        if ukey not in used:
-            used[ukey] = {"name": (r[i_user_name] or "").strip(), "annual":0.0, "half":0.0}
-        if t == "annual": used[ukey]["annual"] += 1.0
-        elif t == "halfday": used[ukey]["half"] += 0.5
-
-    ws_bal = sh.worksheet("balances")
-    bal_vals = ws_bal.get_all_values()
-    if not bal_vals:
-        ws_bal.append_row(["user_key","user_name","annual_total","annual_used","annual_left","half_used","notes"])
-        bal_vals = ws_bal.get_all_values()
-    bhead = [h.strip().lower() for h in bal_vals[0]]
-    # 보장 헤더
-    need = ["user_key","user_name","annual_total","annual_used","annual_left","half_used","notes"]
-    for n in need:
-        if n not in bhead: raise RuntimeError("balances 헤더 불일치: " + ",".join(need))
-
-    # 기존 인덱스
-    idx_map = { (row[0] or "").strip().lower(): i for i,row in enumerate(bal_vals[1:], start=2) }  # user_key -> rownum
-
-    # 벌크 업데이트 대상 수집
-    updates = []
-    for ukey, agg in used.items():
-        rownum = idx_map.get(ukey.lower())
-        # annual_total이 없으면 0으로 가정
-        if rownum:
-            total = bal_vals[rownum-1][2] if len(bal_vals[rownum-1])>2 else "0"
-        else:
-            total = "0"
-        try:
-            total_f = float(total)
-        except:
-            total_f = 0.0
-        annual_used = agg["annual"]
-        half_used = agg["half"]
-        annual_left = max(0.0, total_f - (annual_used + half_used))
-        row = [ukey, agg["name"], str(total_f), annual_used, annual_left, half_used, ""]
-        if rownum:
-            updates.append((rownum, row))
-        else:
-            ws_bal.append_row(row)
-            idx_map[ukey.lower()] = ws_bal.row_count
-
-    # 벌크 업데이트
-    for rownum, row in updates:
-        ws_bal.update(f"A{rownum}:G{rownum}", [row], value_input_option="USER_ENTERED")
+        seen.add(ukey.lower())
+        au, hu, left = calc(ukey, None)
+        if au == 0 and hu == 0:
+            continue
+        row = [""] * bwidth
+        row[off + col["user_key"]] = ukey
+        row[off + col["user_name"]] = c.names[c.name[rows[-1]]]
+        row[off + col["annual_used"]] = f"{au:.1f}"
+        row[off + col["half_used"]] = f"{hu:.1f}"
+        row[off + col["annual_left"]] = f"{left:.1f}"
+        new_rows.append(row)
+
+    if data:
+        with_retry(lambda: ws_bal.batch_update(data, value_input_option="USER_ENTERED"))
+    if new_rows:
+        with_retry(lambda: ws_bal.append_rows(new_rows, value_input_option="USER_ENTERED"))
+    t_end = time.monotonic()
+    return {"year": year, "logs_rows": snap.n, "balance_rows": n_bal,
+            "updated": len(data), "appended": len(new_rows),
+            "read_ms": round((t_read - t0) * 1000), "total_ms": round((t_end - t0) * 1000)}
 
 # --- 날짜 문자열을 KST ISO 주차 문자열로 변환 ---
 def date_to_iso_week_kst(date_str: str) -> str:
@@ -1537,30 +3388,21 @@ def upsert_weekly_schedule_checkin(user_key: str, date_str: str):
 
 # --- 사용자에 대한 사용 가능한 주차 목록 조회 ---
 def available_weeks_for_user(ukey: str):
-    ws = get_ws("schedule_weekly")
-    vals = ws.get_all_values()
-    if not vals:
-        return []
-    header = [h.strip() for h in vals[0]]
-    try:
-        wi = header.index("week"); ui = header.index("user_key")
-    except ValueError:
+    hit = mirror_find("schedule_weekly", user_key=ukey)
+    if hit is not None:
+        return sorted({(r.get("week") or "").strip() for r in hit})
+    stream = SheetStream("schedule_weekly", ("week", "user_key"))
+    wi, ui = stream.col.get("week"), stream.col.get("user_key")
+    if wi is None or ui is None:
         return []
     out = set()
-    for r in vals[1:]:
-        wk = r[wi].strip() if wi < len(r) else ""
-        uk = r[ui].strip() if ui < len(r) else ""
+    for _, r in stream.rows():
+        wk = r[wi].strip()
+        uk = r[ui].strip()
         if uk.lower() == (ukey or "").strip().lower():
             out.add(wk)
     return sorted(out)
 
-# --- 시트 조회 ---
-def get_ws(name: str):
-    try:
-        return sh.worksheet(name)
-    except Exception:
-        raise RuntimeError(f"시트 '{name}'를 찾을 수 없습니다.")
-
 # --- 시트 행을 딕셔너리 목록으로 변환 ---    
 def sheet_rows_as_dicts(ws, header_row=1):
     vals = ws.get_all_values()
@@ -1579,6 +3421,9 @@ def sheet_rows_as_dicts(ws, header_row=1):
 
 # --- 잔여일수 행 조회 ---
 def find_balance_row_for(user_key: str):
+    hit = mirror_find("balances", user_key=user_key)
+    if hit is not None:
+        return hit[0] if hit else None
     ws = get_ws("balances")
     rows = sheet_rows_as_dicts(ws)
     # user_key 완전일치 1순위
@@ -1600,15 +3445,14 @@ def current_iso_week_kst() -> str:
 
 # --- 주간 스케줄 조회 ---
 def find_schedule_for(week: str, user_key: str):
-    ws = get_ws("schedule_weekly")
-    rows = sheet_rows_as_dicts(ws)
-    # week, user_key 모두 일치하는 첫 행
-    for r in rows:
-        if (r.get("week")==week) and ((r.get("user_key") or "").strip().lower()==(user_key or "").strip().lower()):
-            return r
-    # user_key 느슨 비교
-    for r in rows:
-        if (r.get("week")==week) and ((r.get("user_key") or "").strip()==(user_key or "").strip()):
+    hit = mirror_find("schedule_weekly", week=week, user_key=user_key)
+    if hit is not None:
+        return hit[0] if hit else None
+    # week, user_key 모두 일치하는 첫 행 (조각 단위로 읽다가 찾으면 멈춘다)
+    # user_key는 대소문자 무시 비교라 예전 느슨 비교(공백만 제거)도 여기에 포함된다
+    key = (user_key or "").strip().lower()
+    for _, r in SheetStream("schedule_weekly").records():
+        if (r.get("week")==week) and ((r.get("user_key") or "").strip().lower()==key):
             return r
     return None
 
@@ -1621,20 +3465,12 @@ def reply_error(respond, msg="오류가 발생했습니다. 잠시 후 다시 
 
 # --- 사용자 이름 조회 ---
 def resolve_user_name(client, user_id):
-    try:
-        info = client.users_info(user=user_id)
-        p = info["user"]["profile"]
-        return p.get("display_name") or p.get("real_name") or user_id
-    except Exception:
-        return user_id
+    return safe_user_name(client, user_id)
 
 # --- 사용자 이메일 조회 ---    
 def resolve_user_email(client, user_id: str) -> str | None:
-    try:
-        info = client.users_info(user=user_id)  # users:read.email 필요
-        return info["user"]["profile"].get("email")
-    except Exception:
-        return None
+    p = user_profile(client, user_id)  # users:read.email 필요
+    return (p and p["email"]) or None
 
 # ---------- 에러 핸들러 데코레이터 : 슬래시 커맨드에서 예외 발생 시 통일 메시지. ----------
 def slash_guard(fn):
@@ -1679,33 +3515,34 @@ def render_week_table(week: str, r: dict) -> str:
     return f"*{week} 주간 스케줄*\n```{body}```"
 
 # ---과거 빈 date 백필
+# timestamp/date 컬럼만 조각 단위로 읽고, 조각마다 채울 칸을 batch_update 한 번으로 쓴다.
 def backfill_dates_from_timestamps():
-    ws = logs
-    vals = ws.get_all_values()
-    if not vals: return
-    head = [h.strip().lower() for h in vals[0]]
-    idx = {h:i for i,h in enumerate(head)}
-    idate = idx.get("date"); its = idx.get("timestamp") or idx.get("ts")
+    stream = SheetStream("logs", ("timestamp", "ts", "date"))
+    its = stream.col.get("timestamp", stream.col.get("ts"))
+    idate = stream.col.get("date")
     if idate is None or its is None:
         return
-    updates = []
-    for rnum, r in enumerate(vals[1:], start=2):
-        d = (r[idate] if idate < len(r) else "").strip()
-        if not d:
-            ts = (r[its] if its < len(r) else "").strip()
-            if ts:
-                d = ts.split("T", 1)[0]
-                updates.append((rnum, d))
-    for rnum, d in updates:
-        logs.update(
-            range_name=f"F{rnum}:F{rnum}",  # date 열 위치가 F
-            values=[[d]],
-            value_input_option="USER_ENTERED",
-        )
+    date_col = col_letter(stream.offset + idate)
+    ws = get_ws("logs")
+    data = []
+
+    def flush():
+        if data:
+            with_retry(lambda: ws.batch_update(data, value_input_option="USER_ENTERED"))
+            data.clear()
+
+    for rnum, r in stream.rows():
+        ts = r[its].strip()
+        if not r[idate].strip() and ts:
+            data.append({"range": f"{date_col}{rnum}", "values": [[ts.split("T", 1)[0]]]})
+        if len(data) >= stream.chunk_rows:
+            flush()
+    flush()
+    LOGS_STORE.invalidate()  # 채운 날짜는 다음 동기화 때 전체 재로드로 반영
 
 # --- balances 시트에 행 삽입 또는 업데이트 ---
 def upsert_balances_row(ukey, uname, *, override_left=None, override_from=None, note=""):
-    ws = sh.worksheet("balances")
+    ws = get_ws("balances")
     vals = ws.get_all_values()
     if not vals:
         ws.append_row(["user_key","user_name","annual_total","annual_used","annual_left","half_used",
@@ -1748,45 +3585,7 @@ def upsert_balances_row(ukey, uname, *, override_left=None, override_from=None,
 # --- logs 시트에서 사용자 연차/반차 사용량 집계 ---
 def calc_usage_from_logs(user_key: str, *, since: dt.date | None = None, year: int | None = None):
     """logs에서 annual/halfday 사용량 합산."""
-    vals = logs.get_all_values()
-    if not vals:
-        return 0.0, 0.0
-
-    head = [h.strip().lower() for h in vals[0]]
-    idx = {h: i for i, h in enumerate(head)}
-    iu = idx.get("user_key") or idx.get("user_id")
-    it = idx.get("type")
-    idate = idx.get("date")
-    if iu is None or it is None or idate is None:
-        return 0.0, 0.0
-
-    target = (user_key or "").strip().lower()
-    annual_used = 0.0
-    half_used = 0.0
-
-    for r in vals[1:]:
-        if iu >= len(r) or it >= len(r) or idate >= len(r):
-            continue
-        uk = (r[iu] or "").strip().lower()
-        if uk != target:
-            continue
-
-        t = (r[it] or "").strip().lower()
-        d = parse_ymd_safe((r[idate] or "").strip())
-        if not d:
-            continue
-
-        if since and d < since:
-            continue
-        if year and d.year != year:
-            continue
-
-        if t == "annual":
-            annual_used += 1.0
-        elif t == "halfday":
-            half_used += 0.5
-
-    return annual_used, half_used
+    return usage_of(user_key, since=since, year=year, snap=take_logs_snapshot())
 
 # ---------- 이벤트 핸들러 등록 ----------
 @app.event("app_home_opened")
@@ -1800,6 +3599,7 @@ def on_mention(body, say):
     
 # ---------- /출근, /퇴근 커맨드 ----------
 @app.command("/출근")
+@post_ack(Lane.PUNCH)
 def 출근_cmd(ack, body, respond, client):
     ack()
     uid = body["user_id"]
@@ -1807,13 +3607,14 @@ def 출근_cmd(ack, body, respond, client):
     uname = safe_user_name(client, uid)
     ds = today_kst_ymd()
     try:
-        # 중복 / 재시도 / 로그 기록까지 포함
-        guard_and_append(ukey, uname, "checkin", date_str=ds, by_user=ukey, alt_user_key=uid)
-        # 주간 스케줄 자동 반영 쓰는 경우만
-        try:
-            upsert_weekly_schedule_checkin(ukey, ds)
-        except Exception:
-            pass
+        with request_deadline(INTERACTIVE_DEADLINE_SEC):
+            # 중복 / 재시도 / 로그 기록까지 포함
+            guard_and_append(ukey, uname, "checkin", date_str=ds, by_user=ukey, alt_user_key=uid)
+            # 주간 스케줄 자동 반영 쓰는 경우만
+            try:
+                upsert_weekly_schedule_checkin(ukey, ds)
+            except Exception:
+                pass
         respond(f"{uname} 출근 등록 완료")
     except Exception as e:
         respond(human_error(e))
@@ -1821,6 +3622,7 @@ def 출근_cmd(ack, body, respond, client):
 
 # ---------- /퇴근 커맨드 ----------
 @app.command("/퇴근")
+@post_ack(Lane.PUNCH)
 def 퇴근_cmd(ack, body, respond, client):
     ack()
     uid = body["user_id"]
@@ -1828,20 +3630,33 @@ def 퇴근_cmd(ack, body, respond, client):
     uname = safe_user_name(client, uid)
     ds = today_kst_ymd()
     try:
-        guard_and_append(ukey, uname, "checkout", date_str=ds, by_user=ukey, alt_user_key=uid)
+        with request_deadline(INTERACTIVE_DEADLINE_SEC):
+            guard_and_append(ukey, uname, "checkout", date_str=ds, by_user=ukey, alt_user_key=uid)
         respond(f"{uname} 퇴근 등록 완료")
     except Exception as e:
         respond(human_error(e))
 
 # ---------- 출근/퇴근 키워드 핸들러 ----------
 @app.message(re.compile(r"^\s*(출근|퇴근)\s*$"))
+@post_ack(Lane.PUNCH)
 def on_keyword(message, say, context):
     t = "출근" if context["matches"][0] == "출근" else "퇴근"
-    append_log(message["user"], "", t)
+    # 같은 사용자/타입/날짜는 DEDUP_WINDOW_SEC 안에 한 번만
+    key = f"kw:{idemp_key(message['user'], t, today_kst_ymd())}"
+    if not SLACK_SEEN.add(key, DEDUP_WINDOW_SEC):
+        say(f"{context['matches'][0]}은 방금 등록했습니다.")
+        return
+    try:
+        append_log(message["user"], "", t)
+    except Exception as e:
+        SLACK_SEEN.discard(key)  # 기록이 없으니 재시도는 받아야 한다
+        say(human_error(e))
+        return
     say(f"{context['matches'][0]} 등록 완료")
 
 # ---------- /스케줄 커맨드 ----------
 @app.command("/스케줄")
+@post_ack(Lane.ADMIN)
 def 스케줄_cmd(ack, body, respond, client):
     ack()
     text = (body.get("text") or "").strip()
@@ -1935,8 +3750,33 @@ def 잔여갱신_modal(ack, body, client):
           ]}
     )
 
+# ---------- /잔여재계산 (관리자): 전원 잔여 일괄 재계산 ----------
+@app.command("/잔여재계산")
+@post_ack(Lane.ADMIN)
+def 잔여재계산_cmd(ack, body, respond, client):
+    ack()
+    ok, why = require_admin(body["user_id"], client)
+    if not ok:
+        respond(why); return
+    year = None
+    text = (body.get("text") or "").strip()
+    if text:
+        if not re.fullmatch(r"\d{4}", text):
+            respond("사용법: `/잔여재계산` 또는 `/잔여재계산 2025`"); return
+        year = int(text)
+    try:
+        st = recompute_balances(year)
+        respond(
+            f"*{st['year']}년 잔여 재계산 완료*\n"
+            f"• 갱신 {st['updated']}명 / 신규 {st['appended']}명 (balances {st['balance_rows']}행, logs {st['logs_rows']}행)\n"
+            f"• 읽기 {st['read_ms']}ms, 전체 {st['total_ms']}ms"
+        )
+    except Exception as e:
+        respond(f"재계산 오류: {human_error(e)}")
+
 # --- 잔여일수 재정의 모달 제출 핸들러 ---    
 @app.view("balances_update_submit")
+@post_ack(Lane.ADMIN)
 def 잔여갱신_submit(ack, body, view, client, logger):
     ack()  # 빠른 ACK
     admin_uid = body["user"]["id"]
@@ -2006,22 +3846,24 @@ def 잔여갱신_submit(ack, body, view, client, logger):
 
 # ---------- /잔여debug 커맨드 (개발용) ----------
 @app.command("/잔여debug")
+@post_ack(Lane.ADMIN)
 def 잔여debug(ack, body, respond, client):
     ack()
     uid = body["user_id"]
     ukey = safe_user_key(client, uid)
-    ws = sh.worksheet("balances")
-    vals = ws.get_all_values()
-    head = [h.strip().lower() for h in vals[0]] if vals else []
-    row = next((r for r in vals[1:] if (r[0] or "").strip().lower()==ukey.lower()), [])
+    # balances·logs 동기화를 한 번에 읽고, 잔여는 그 값으로 계산 (기록 없음)
+    _, head, row = read_balance_row(ukey)
+    bal = {h: (row[i] if i < len(row) else "") for i, h in enumerate(head)}
     resp = {
         "ukey": ukey,
-        "override_left": (row[ head.index("override_left") ] if "override_left" in head and row else ""),
-        "override_from": (row[ head.index("override_from") ] if "override_from" in head and row else ""),
-        "annual_total":  (row[ head.index("annual_total") ] if "annual_total"  in head and row else ""),
-        "annual_used":   (row[ head.index("annual_used") ]  if "annual_used"   in head and row else ""),
-        "half_used":     (row[ head.index("half_used") ]    if "half_used"     in head and row else ""),
-        "effective_left": effective_left_for(ukey),
+        "override_left": bal.get("override_left", ""),
+        "override_from": bal.get("override_from", ""),
+        "annual_total":  bal.get("annual_total", ""),
+        "annual_used":   bal.get("annual_used", ""),
+        "half_used":     bal.get("half_used", ""),
+        "effective_left": compute_balance(ukey, bal).left,
+        "sheets_wait": sheets_wait_time(),
+        "post_ack": post_ack_stats(),
     }
     respond(f"```{resp}```")
 
@@ -2036,6 +3878,14 @@ def on_join(body, client):
             text=f"<@{user}> 님 환영합니다. `/출근`, `/퇴근`, `/근태`를 사용해보세요."
         )
 
+# ---------- 프로필 변경/신규 입사: 캐시 갱신 ----------
+@app.event("user_change")
+@app.event("team_join")
+def on_user_update(event):
+    u = event.get("user") or {}
+    if u.get("id"):
+        user_cache.put(u["id"], profile_of(u))
+
 def load_holidays() -> set[str]:
     """holidays 시트 1열에 YYYY-MM-DD가 있다고 가정."""
     global HOLIDAYS_CACHE
@@ -2043,20 +3893,22 @@ def load_holidays() -> set[str]:
         return HOLIDAYS_CACHE
     try:
         ws = get_ws("holidays")
-        vals = ws.get_all_values()
-        s = set()
-        for r in vals[1:] if vals and vals[0] else vals:
-            if not r:
-                continue
-            d = (r[0] or "").strip()
-            if parse_ymd_safe(d):
-                s.add(d)
-        HOLIDAYS_CACHE = s
-        return s
+        HOLIDAYS_CACHE = parse_holidays(ws.get_all_values())
+        return HOLIDAYS_CACHE
     except Exception:
         HOLIDAYS_CACHE = set()
         return HOLIDAYS_CACHE
 
+def parse_holidays(vals: list) -> set[str]:
+    s = set()
+    for r in vals[1:] if vals and vals[0] else vals:
+        if not r:
+            continue
+        d = (r[0] or "").strip()
+        if parse_ymd_safe(d):
+            s.add(d)
+    return s
+
 def is_weekend(d: dt.date) -> bool:
     # 월=0 ... 일=6
     return d.weekday() >= 5
@@ -2073,126 +3925,186 @@ def iter_business_dates(start_s: str, end_s: str):
         if d and is_business_day(d):
             yield s
 
-def logs_usage_since(user_key: str, since_date: dt.date | None = None, year: int | None = None):
-    """
-    annual: 1.0, halfday: 0.5
-    단, 주말/공휴일 기록은 차감하지 않음.
-    """
-    ws = get_ws("logs")
-    vals = ws.get_all_values()
-    if not vals:
-        return 0.0, 0.0
-
-    head = [h.strip().lower() for h in vals[0]]
-    idx = {h: i for i, h in enumerate(head)}
-    iu = idx.get("user_key") or idx.get("user_id")
-    it = idx.get("type")
-    idate = idx.get("date")
-    if iu is None or it is None or idate is None:
-        return 0.0, 0.0
-
-    target = (user_key or "").strip().lower()
-    annual_used = 0.0
-    half_used = 0.5 * 0  # 명시
-
-    for r in vals[1:]:
-        if iu >= len(r) or it >= len(r) or idate >= len(r):
-            continue
-
-        uk = (r[iu] or "").strip().lower()
-        if uk != target:
-            continue
-
-        t = (r[it] or "").strip().lower()
-        d = parse_ymd_safe((r[idate] or "").strip())
-        if not d:
-            continue
-
-        # 범위/연도 필터
-        if since_date and d < since_date:
-            continue
-        if year and d.year != year:
-            continue
-
-        # 주말/공휴일은 차감 제외
-        if not is_business_day(d):
-            continue
-
-        if t == "annual":
-            annual_used += 1.0
-        elif t == "halfday":
-            half_used += 0.5
-
-    return annual_used, half_used
-
-def any_halfday_on_date(user_key: str, date_str: str, alt_user_key: str | None = None) -> bool:
-    ws = get_ws("logs")
-    vals = ws.get_all_values()
-    if not vals:
-        return False
-    head = [h.strip().lower() for h in vals[0]]
-    idx = {h: i for i, h in enumerate(head)}
-    iu = idx.get("user_key") or idx.get("user_id")
-    it = idx.get("type")
-    idate = idx.get("date")
-    if iu is None or it is None or idate is None:
-        return False
-
-    uk_primary = (user_key or "").strip().lower()
-    uk_alt = (alt_user_key or "").strip().lower()
-    want_date = (date_str or "").strip()
-
-    def same_user(v):
-        v = (v or "").strip().lower()
-        return v == uk_primary or (uk_alt and v == uk_alt)
-
-    for r in vals[1:]:
-        if iu >= len(r) or it >= len(r) or idate >= len(r):
-            continue
-        if not same_user(r[iu]):
-            continue
-        if (r[it] or "").strip().lower() != "halfday":
-            continue
-        if (r[idate] or "").strip() != want_date:
-            continue
-        return True
-    return False
-
-def count_halfday_on_date(user_key: str, date_str: str, alt_user_key: str | None = None) -> int:
-    ws = get_ws("logs")
-    vals = ws.get_all_values()
-    if not vals:
-        return 0
-    head = [h.strip().lower() for h in vals[0]]
-    idx = {h: i for i, h in enumerate(head)}
-    iu = idx.get("user_key") or idx.get("user_id")
-    it = idx.get("type")
-    idate = idx.get("date")
-    if iu is None or it is None or idate is None:
-        return 0
-
-    uk_primary = (user_key or "").strip().lower()
-    uk_alt = (alt_user_key or "").strip().lower()
-    want_date = (date_str or "").strip()
-
-    def same_user(v):
-        v = (v or "").strip().lower()
-        return v == uk_primary or (uk_alt and v == uk_alt)
-
-    c = 0
-    for r in vals[1:]:
-        if iu >= len(r) or it >= len(r) or idate >= len(r):
-            continue
-        if not same_user(r[iu]):
-            continue
-        if (r[it] or "").strip().lower() != "halfday":
-            continue
-        if (r[idate] or "").strip() != want_date:
-            continue
-        c += 1
-    return c
+# =========================================================
+# 연차/반차 사용량 계산 (NumPy) — /잔여, 연차 초과 검사, /잔여재계산이 모두 여기만 쓴다
+# ---------------------------------------------------------
+# logs에서 영업일 연차/반차 행만 골라 (user_id, 날짜)별 기록 건수로 접는다.
+# 날짜 하나의 사용량 규칙은 _day_rule 한 곳:
+#   - 영업일만 (주말/공휴일 기록은 차감하지 않음)
+#   - 연차는 날짜당 1일, 같은 날 연차가 있으면 반차는 무시
+#   - 반차는 날짜당 0.5씩 최대 1일
+# UsageIndex는 열 배열 하나에 대한 캐시로, 처음에 전체 행을 한 번 접고
+# 이후에는 늘어난 행만 접어 (user_id, 연도) 합계를 규칙 결과의 차이만큼 고친다 (logs는 append-only).
+# 연도 조회는 dict 한 번, 시작일 지정 조회는 그 사용자의 날짜만 훑는다.
+# 아직 시트에 없는 저널 행은 조회할 때 해당 날짜의 건수에 더해 규칙을 다시 적용한다.
+# =========================================================
+_DAY_KEY = 1 << 22  # (user_id, ordinal) → 하나의 정수 키
+_holiday_ord = (None, np.zeros(0, dtype=np.int64))
+
+def _holiday_ordinals() -> np.ndarray:
+    global _holiday_ord
+    hs = load_holidays()
+    if _holiday_ord[0] is not hs:
+        _holiday_ord = (hs, np.array(sorted(ymd_ordinal(s) for s in hs), dtype=np.int64))
+    return _holiday_ord[1]
+
+class DayCounts:
+    """정렬된 키(user_id * _DAY_KEY + ordinal)별 연차/반차 기록 건수."""
+
+    def __init__(self, keys: np.ndarray, annual: np.ndarray, half: np.ndarray):
+        self.keys, self.annual, self.half = keys, annual, half
+
+    @classmethod
+    def from_rows(cls, u: np.ndarray, d: np.ndarray, t: np.ndarray) -> "DayCounts":
+        """user_id/ordinal/LogType 배열 → 영업일 연차/반차 행만 같은 키끼리 접은 건수."""
+        ia, ih = t == LogType.ANNUAL, t == LogType.HALFDAY
+        # ordinal 1(0001-01-01)이 월요일 → (d-1)%7 < 5가 평일
+        m = (ia | ih) & (d > 0) & ((d - 1) % 7 < 5) & ~np.isin(d, _holiday_ordinals())
+        uk, inv = np.unique(u[m] * _DAY_KEY + d[m], return_inverse=True)
+        return cls(uk, np.bincount(inv, weights=ia[m], minlength=len(uk)),
+                   np.bincount(inv, weights=ih[m], minlength=len(uk)))
+
+def _day_rule(annual: np.ndarray, half: np.ndarray) -> tuple:
+    """날짜별 건수 → (연차 사용일, 반차 사용일) 배열."""
+    return (annual > 0).astype(np.float64), np.where(annual > 0, 0.0, 0.5 * np.minimum(half, 2))
+
+def _ordinal_years(d: np.ndarray) -> np.ndarray:
+    return (np.datetime64("0001-01-01") + (d - 1).astype("timedelta64[D]")).astype("datetime64[Y]").astype(np.int64) + 1970
+
+class UsageIndex:
+    """logs 열 배열 하나의 앞 n행에 대한 날짜별 건수와 (user_id, 연도) 사용일 합계."""
+
+    def __init__(self, columns: LogColumns, holidays: set):
+        self.columns, self.holidays, self.n = columns, holidays, 0
+        self.days = {}   # user_id -> {ordinal: (연차 건수, 반차 건수)}
+        self.years = {}  # (user_id, 연도) -> [연차 사용일, 반차 사용일]
+
+    def advance(self, n: int):
+        """[self.n, n) 행을 접어 넣는다. 바뀐 날짜만 규칙 결과의 차이를 합계에 반영."""
+        c, n0 = self.columns, self.n
+        if n <= n0:
+            return
+        self.n = n
+        new = DayCounts.from_rows(np.frombuffer(c.user[n0:n], dtype=np.intc).astype(np.int64),
+                                  np.frombuffer(c.date[n0:n], dtype=np.intc).astype(np.int64),
+                                  np.frombuffer(c.type[n0:n], dtype=np.byte))
+        if not len(new.keys):
+            return
+        uids, ords = new.keys // _DAY_KEY, new.keys % _DAY_KEY
+        old = np.array([self.days.get(u, {}).get(o, (0.0, 0.0)) for u, o in zip(uids.tolist(), ords.tolist())],
+                       dtype=np.float64).reshape(-1, 2)
+        a0, h0 = _day_rule(old[:, 0], old[:, 1])
+        na, nh = old[:, 0] + new.annual, old[:, 1] + new.half
+        a1, h1 = _day_rule(na, nh)
+        for u, o, y, ca, ch, da, dh in zip(uids.tolist(), ords.tolist(), _ordinal_years(ords).tolist(),
+                                           na.tolist(), nh.tolist(), (a1 - a0).tolist(), (h1 - h0).tolist()):
+            self.days.setdefault(u, {})[o] = (ca, ch)
+            tot = self.years.setdefault((u, y), [0.0, 0.0])
+            tot[0] += da
+            tot[1] += dh
+
+    def usage(self, uid: int | None, year: int | None, since: dt.date | None, extra: list) -> tuple:
+        """(연차, 반차) 사용일. extra는 저널에만 있는 [(ordinal, LogType)]."""
+        days = self.days.get(uid, {}) if uid is not None else {}
+        lo, hi = _ordinal_range(year, since)
+        if year and (since is None or since <= dt.date(year, 1, 1)):
+            a, h = self.years.get((uid, year), (0.0, 0.0))
+        else:
+            got = [v for o, v in days.items() if lo <= o <= hi]
+            a, h = (float(x.sum()) for x in _day_rule(*np.array(got or [(0.0, 0.0)]).T))
+        extra = [(o, t) for o, t in extra if lo <= o <= hi]
+        if extra:
+            # 저널 행이 있는 날짜만 (logs 건수 + 저널 건수)로 규칙을 다시 적용해 차이를 더한다
+            d, t = (np.array(x, dtype=np.int64) for x in zip(*extra))
+            jc = DayCounts.from_rows(np.zeros(len(d), dtype=np.int64), d, t)
+            old = np.array([days.get(o, (0.0, 0.0)) for o in jc.keys.tolist()], dtype=np.float64).reshape(-1, 2)
+            a0, h0 = _day_rule(old[:, 0], old[:, 1])
+            a1, h1 = _day_rule(old[:, 0] + jc.annual, old[:, 1] + jc.half)
+            a, h = a + float((a1 - a0).sum()), h + float((h1 - h0).sum())
+        return float(a), float(h)
+
+def _ordinal_range(year: int | None, since: dt.date | None) -> tuple:
+    lo, hi = 1, _DAY_KEY - 1
+    if since:
+        lo = max(lo, since.toordinal())
+    if year:
+        lo = max(lo, dt.date(year, 1, 1).toordinal())
+        hi = dt.date(year, 12, 31).toordinal()
+    return lo, hi
+
+_index_lock = threading.Lock()
+_usage_index = None
+
+# --- 스냅샷에 맞춘 UsageIndex를 잡고 fn(index) 실행 ---
+# 캐시된 인덱스가 같은 열 배열/공휴일이고 스냅샷보다 앞서 있지 않으면 늘어난 행만 접어 쓴다.
+# 스냅샷이 더 오래됐으면 그 스냅샷만의 인덱스를 따로 만든다 (캐시는 그대로).
+def with_usage_index(snap: LogsSnapshot, fn):
+    global _usage_index
+    hs = load_holidays()  # 시트 읽기는 lock 밖에서
+    _holiday_ordinals()
+    with _index_lock:
+        idx = _usage_index
+        if idx is None or idx.columns is not snap.columns or idx.holidays is not hs:
+            idx = _usage_index = UsageIndex(snap.columns, hs)
+        elif idx.n > snap.n:
+            idx = UsageIndex(snap.columns, hs)
+        idx.advance(snap.n)
+        return fn(idx)
+
+# --- 저널 행을 사용자별 [(ordinal, LogType)]로 ---
+def _extra_by_user(rows: list) -> dict:
+    out = {}
+    for u, o, t in rows:
+        out.setdefault(u, []).append((o, t))
+    return out
 
-def explain_skip_for_annual(user_key: str, ds: str, *, alt_user_key: str | None = None) -> str | None:
+# --- 한 사용자의 (연차 사용일, 반차 사용일): logs + 저널에만 있는 행 ---
+def usage_of(user_key: str, *, year: int | None = None, since: dt.date | None = None,
+             snap: LogsSnapshot | None = None) -> tuple:
+    """snap이 없으면 logs 저장소의 현재 내용 (동기화 없음)."""
+    pending = LOG_JOURNAL.pending_leave_rows() if LOG_JOURNAL is not None and snap is None else None
+    snap = snap or LOGS_STORE.peek()
+    key = (user_key or "").strip().lower()
+    extra = _extra_by_user(journal_leave_rows(snap, pending)).get(key, [])
+    uid = snap.user_id(user_key)
+    return with_usage_index(snap, lambda idx: idx.usage(uid, year, since, extra))
+
+class UsageTable:
+    """user_id별 (연차, 반차) 사용일."""
+
+    def __init__(self, snap: LogsSnapshot, annual: np.ndarray, half: np.ndarray):
+        self.snap, self.annual, self.half = snap, annual, half
+
+    def get(self, user_key: str | None) -> tuple:
+        uid = self.snap.user_id(user_key)
+        if uid is None or uid >= len(self.annual):
+            return 0.0, 0.0
+        return float(self.annual[uid]), float(self.half[uid])
+
+# --- 전 사용자 사용일을 한 번에 (저널 행 포함, logs에 아직 없는 사용자는 usage_of로) ---
+def usage_table(snap: LogsSnapshot, *, year: int | None = None, since: dt.date | None = None) -> UsageTable:
+    extra = _extra_by_user(journal_leave_rows(snap))
+    keys = list(snap.columns.user_keys)
+
+    def fill(idx):
+        out = np.zeros((len(keys), 2))
+        for uid, k in enumerate(keys):
+            out[uid] = idx.usage(uid, year, since, extra.get(k.strip().lower(), []))
+        return out
+    got = with_usage_index(snap, fill)
+    return UsageTable(snap, got[:, 0], got[:, 1])
+
+def any_halfday_on_date(user_key: str, date_str: str, alt_user_key: str | None = None,
+                        *, snap: LogsSnapshot | None = None) -> bool:
+    return count_halfday_on_date(user_key, date_str, alt_user_key=alt_user_key, snap=snap) > 0
+
+def count_halfday_on_date(user_key: str, date_str: str, alt_user_key: str | None = None,
+                          *, snap: LogsSnapshot | None = None) -> int:
+    return ((snap or LOGS_STORE).count(user_key, "halfday", date_str, alt_user_key=alt_user_key)
+            + journal_count(user_key, "halfday", date_str, alt_user_key=alt_user_key))
+
+def explain_skip_for_annual(user_key: str, ds: str, *, alt_user_key: str | None = None,
+                            snap: LogsSnapshot | None = None) -> str | None:
     """
     annual 제출 시, 해당 날짜 ds가 왜 스킵되는지 사유 문자열을 반환.
     사유가 없으면 None (즉, 저장 가능).
@@ -2206,24 +4118,25 @@ def explain_skip_for_annual(user_key: str, ds: str, *, alt_user_key: str | None
         return "주말/공휴일은 연차 기록 대상이 아닙니다."
 
     # 상호배타: 해당 날짜에 반차가 하나라도 있으면 연차 금지
-    if any_halfday_on_date(user_key, ds, alt_user_key=alt_user_key):
+    if any_halfday_on_date(user_key, ds, alt_user_key=alt_user_key, snap=snap):
         return "해당 날짜에 반차가 있어 연차를 등록할 수 없습니다."
 
     # 중복: 같은 날짜 연차 이미 있음
-    if already_logged(user_key, "annual", ds, alt_user_key=alt_user_key):
+    if already_logged(user_key, "annual", ds, alt_user_key=alt_user_key, snap=snap):
         return "이미 해당 날짜에 연차 기록이 있습니다."
 
     return None  # 저장 가능
 
 # --- 연차 기간 제출 시, 저장 가능한 날짜들과 스킵(사유) 목록 반환 ---
-def resolve_annual_savables(user_key: str, start_s: str, end_s: str, *, alt_user_key: str | None = None):
+def resolve_annual_savables(user_key: str, start_s: str, end_s: str, *, alt_user_key: str | None = None,
+                            snap: LogsSnapshot | None = None):
     dates_all = list(iter_dates(start_s, end_s))
     savable, skips = [], []
     for ds in dates_all:
         d = parse_ymd_safe(ds)
         if not is_business_day(d):              # 주말/공휴일 스킵
             skips.append((ds, "주말/공휴일은 연차 기록 대상이 아닙니다.")); continue
-        reason = explain_skip_for_annual(user_key, ds, alt_user_key=alt_user_key)  # 반차 충돌/중복 등
+        reason = explain_skip_for_annual(user_key, ds, alt_user_key=alt_user_key, snap=snap)  # 반차 충돌/중복 등
         if reason: skips.append((ds, reason))
         else: savable.append(ds)
     return savable, skips
@@ -2247,4 +4160,7 @@ def contains_past_ymd(start_s: str, end_s: str) -> bool:
 
 
 if __name__ == "__main__":
+    # SIGTERM에도 atexit(쓰기 큐 flush)가 돌도록 정상 종료로 변환
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    start_user_prefetch(app.client)
     SocketModeHandler(app, os.environ["SLACK_APP_TOKEN"]).start()
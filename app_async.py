@@ -0,0 +1,38 @@
+# =========================================================
+# asyncio 실행 진입점 (AsyncApp + aiohttp Socket Mode)
+# ---------------------------------------------------------
+# Socket Mode 연결과 요청 수신은 이벤트 루프 하나에서 처리하고,
+# app.py의 기존 리스너는 그대로 DISPATCH_WORKERS개짜리 executor에서 dispatch한다.
+# dispatch는 리스너가 ack()하는 즉시 돌아오고 본문(Sheets I/O)은 app.py의 listener_executor가
+# 이어서 처리하므로, 느린 Sheets 호출이 다른 명령의 수신/ack를 막지 않는다.
+#   python app_async.py
+# =========================================================
+import os, sys, signal, asyncio
+from concurrent.futures import ThreadPoolExecutor
+from slack_bolt import BoltRequest
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+
+import app as bot
+
+DISPATCH_WORKERS = int(os.getenv("DISPATCH_WORKERS") or 16)
+DISPATCH_POOL = ThreadPoolExecutor(max_workers=DISPATCH_WORKERS, thread_name_prefix="dispatch")
+
+async_app = AsyncApp(token=os.environ["SLACK_BOT_TOKEN"])
+
+# --- 모든 요청을 동기 앱으로 넘긴다 (next()를 부르지 않으므로 여기서 응답이 결정됨) ---
+@async_app.middleware
+async def dispatch_to_sync_app(req, resp, next):
+    body = req.body if req.mode == "socket_mode" else req.raw_body
+    sync_req = BoltRequest(body=body, query=req.query, headers=req.headers, mode=req.mode)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(DISPATCH_POOL, bot.app.dispatch, sync_req)
+
+async def main():
+    bot.start_user_prefetch(bot.app.client)
+    await AsyncSocketModeHandler(async_app, os.environ["SLACK_APP_TOKEN"]).start_async()
+
+if __name__ == "__main__":
+    # SIGTERM에도 atexit(쓰기 큐 flush)가 돌도록 정상 종료로 변환
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    asyncio.run(main())
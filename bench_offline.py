@@ -0,0 +1,106 @@
+# =========================================================
+# 오프라인 호출 수 점검 (Slack/Google 연결 없이)
+# ---------------------------------------------------------
+# STORAGE_BACKEND=memory 위에서 명령을 실제 dispatch 경로로 돌리고
+# api_call_stats() 차이로 명령당 Sheets 호출 수를 출력한다.
+#   python bench_offline.py
+# Slack 쪽(auth.test, users.info, response_url)은 이 스크립트 안에서만 가짜로 바꾼다.
+# =========================================================
+import os, sys, time, asyncio, threading
+
+os.environ.update(STORAGE_BACKEND="memory", SLACK_BOT_TOKEN="xoxb-offline", LOG_JOURNAL_PATH="")
+os.environ.setdefault("MEMORY_LATENCY_MS", "100")
+os.environ.setdefault("SHEETS_READ_QUOTA_PER_MIN", "100000")
+os.environ.setdefault("SHEETS_WRITE_QUOTA_PER_MIN", "100000")
+
+from slack_sdk.web import WebClient
+from slack_sdk.web.slack_response import SlackResponse
+from slack_sdk.web.async_client import AsyncWebClient
+from slack_sdk.web.async_slack_response import AsyncSlackResponse
+import slack_bolt.context.respond.respond as bolt_respond
+
+AUTH = dict(ok=True, user_id="UBOT", bot_id="BBOT", team_id="T", url="", user="bot", team="t")
+
+async def _async_auth_test(self, **kwargs):
+    return AsyncSlackResponse(client=self, http_verb="POST", api_url="", req_args={}, data=AUTH, headers={}, status_code=200)
+
+WebClient.auth_test = lambda self, **kwargs: SlackResponse(
+    client=self, http_verb="POST", api_url="", req_args={}, data=AUTH, headers={}, status_code=200)
+WebClient.users_info = lambda self, user, **kwargs: {"user": {"profile": {"email": f"{user.lower()}@example.com", "display_name": user}}}
+AsyncWebClient.auth_test = _async_auth_test
+
+RESPONSES = []
+_responded = threading.Condition()
+
+def _capture(self, text="", **kwargs):
+    with _responded:
+        RESPONSES.append(text)
+        _responded.notify_all()
+
+bolt_respond.Respond.__call__ = _capture
+
+import app as bot
+from slack_bolt import BoltRequest
+
+# --- 슬래시 명령 본문 (trigger_id는 실제처럼 요청마다 새로) ---
+def command_body(command: str, user: str, text: str = "") -> dict:
+    return {"token": "x", "team_id": "T", "api_app_id": "A", "channel_id": "C", "user_id": user,
+            "command": command, "text": text, "response_url": "https://hooks.slack.com/offline",
+            "trigger_id": f"{user}.{time.monotonic_ns()}"}
+
+def wait_responses(n: int, timeout: float = 60.0):
+    end = time.monotonic() + timeout
+    with _responded:
+        while len(RESPONSES) < n and time.monotonic() < end:
+            _responded.wait(end - time.monotonic())
+
+def calls_since(before: dict) -> dict:
+    now = bot.api_call_stats()
+    return {f"{op}:{sheet}": now[k] - before.get(k, 0) for k in now for op, sheet in [k] if now[k] != before.get(k, 0)}
+
+# --- 동기 앱으로 명령 하나 → 응답까지의 Sheets 호출 ---
+def run_command(command: str, user: str, text: str = "") -> dict:
+    before, n = bot.api_call_stats(), len(RESPONSES)
+    bot.app.dispatch(BoltRequest(body=command_body(command, user, text), mode="socket_mode"))
+    wait_responses(n + 1)
+    return calls_since(before)
+
+def seed(n_users: int, n_balances: int):
+    """사용자마다 연차 1건. 앞쪽 n_balances명만 balances 행이 있다."""
+    logs = bot.get_ws("logs")
+    logs.append_rows([[f"2026-03-{2 + i % 5:02d}T09:00:00+09:00", f"u{i}@example.com", f"U{i}", "annual", "",
+                       f"2026-03-{2 + i % 5:02d}", "bench", ""] for i in range(n_users)])
+    bot.get_ws("balances").append_rows([[f"u{i}@example.com", f"U{i}", "15"] + [""] * 7 for i in range(n_balances)])
+
+# --- AsyncApp 진입점으로 동시 /출근 ---
+def burst_checkins(n: int) -> dict:
+    import app_async
+    from slack_bolt.request.async_request import AsyncBoltRequest
+
+    async def one(i):
+        req = AsyncBoltRequest(body=command_body("/출근", f"P{i}"), mode="socket_mode")
+        return await app_async.async_app.async_dispatch(req)
+
+    async def main():
+        return await asyncio.gather(*[one(i) for i in range(n)])
+
+    n0, t0 = len(RESPONSES), time.monotonic()
+    acks = asyncio.run(main())
+    ack_sec = time.monotonic() - t0
+    # 대기열을 넘친 요청은 ack 본문으로 BUSY_MSG를 받고 끝난다
+    busy = sum(1 for r in acks if bot.BUSY_MSG in (r.body or ""))
+    wait_responses(n0 + n - busy, timeout=120)
+    done = sum(1 for r in RESPONSES[n0:] if r.endswith("출근 등록 완료"))
+    checkins = sum(1 for r in bot.get_ws("logs").get_all_values()[1:] if r[3] == "checkin")
+    return {"acked": sum(1 for r in acks if r.status == 200), "busy": busy, "ack_sec": round(ack_sec, 2),
+            "completed": done, "logged": checkins}
+
+if __name__ == "__main__":
+    seed(300, 200)
+    print("/잔여 (cold):", run_command("/잔여", "U1"))
+    print("/잔여 (warm):", run_command("/잔여", "U2"))
+    before = bot.api_call_stats()
+    stats = bot.recompute_balances(2026)
+    print("recompute 300 users:", calls_since(before), {k: stats[k] for k in ("updated", "appended")})
+    print("200 concurrent /출근 (AsyncApp):", burst_checkins(200))
+    sys.exit(0)
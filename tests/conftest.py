@@ -0,0 +1,31 @@
+# =========================================================
+# 테스트 공통: memory 백엔드로 app을 불러오고, 테스트마다 빈 시트/캐시로 시작
+# =========================================================
+import os, sys
+
+os.environ.update(STORAGE_BACKEND="memory", SLACK_BOT_TOKEN="xoxb-test", LOG_JOURNAL_PATH="",
+                  SQLITE_MIRROR_PATH="", SHEETS_READ_QUOTA_PER_MIN="100000", SHEETS_WRITE_QUOTA_PER_MIN="100000")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import app as bot
+
+
+@pytest.fixture(autouse=True)
+def fresh(monkeypatch):
+    """헤더만 있는 시트 5장, 빈 logs 저장소/캐시, 닫힌 브레이커, 저널 없음."""
+    monkeypatch.setattr(bot, "sh", bot.MemorySpreadsheet.seeded())
+    monkeypatch.setattr(bot, "LOGS_STORE", bot.LogsStore())
+    monkeypatch.setattr(bot, "APPEND_FLIGHT", bot.SingleFlight())
+    monkeypatch.setattr(bot, "SHEETS_BREAKER", bot.CircuitBreaker(bot.BREAKER_FAIL_THRESHOLD, bot.BREAKER_COOLDOWN_SEC))
+    monkeypatch.setattr(bot, "LOG_JOURNAL", None)
+    monkeypatch.setattr(bot, "HOLIDAYS_CACHE", None)
+    monkeypatch.setattr(bot, "_usage_index", None)
+    bot.WS_REGISTRY.invalidate()
+    yield bot
+    bot.WS_REGISTRY.invalidate()
+
+
+def log_rows(bot, type_=None) -> list:
+    rows = bot.get_ws("logs").get_all_values()[1:]
+    return [r for r in rows if type_ is None or r[3] == type_]
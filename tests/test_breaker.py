@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+import app as bot
+
+COOLDOWN = 0.05
+
+
+def test_opens_after_threshold_and_probes_once():
+    b = bot.CircuitBreaker(threshold=3, cooldown_sec=COOLDOWN)
+    for _ in range(2):
+        b.record_failure()
+    assert b.state == b.CLOSED and b.allow()
+    b.record_failure()
+    assert b.state == b.OPEN and not b.allow()
+    assert 0 < b.retry_in() <= COOLDOWN
+
+    time.sleep(COOLDOWN)
+    assert b.allow()            # 반열림: 시험 호출 하나만
+    assert b.state == b.HALF_OPEN
+    assert not b.allow()
+    b.record_success()
+    assert b.state == b.CLOSED and b.allow()
+
+
+def test_failed_probe_reopens():
+    b = bot.CircuitBreaker(threshold=1, cooldown_sec=COOLDOWN)
+    b.record_failure()
+    time.sleep(COOLDOWN)
+    assert b.allow()
+    b.record_failure()
+    assert b.state == b.OPEN and not b.allow()
+    time.sleep(COOLDOWN)
+    assert b.allow()
+
+
+class NoTokens:
+    def acquire(self, max_wait=None):
+        return None
+
+
+def test_quota_rejection_releases_probe(monkeypatch):
+    b = bot.CircuitBreaker(threshold=1, cooldown_sec=COOLDOWN)
+    monkeypatch.setattr(bot, "SHEETS_BREAKER", b)
+    b.record_failure()
+    time.sleep(COOLDOWN)
+    bucket = bot.SHEETS_READ_BUCKET
+    monkeypatch.setattr(bot, "SHEETS_READ_BUCKET", NoTokens())
+    with pytest.raises(bot.SheetsUnavailable):
+        bot.sheets_call("get", "logs", lambda: "x")
+    assert b.state == b.HALF_OPEN
+
+    # 시험 호출을 보내지 못했으니 다음 호출이 다시 시험한다
+    monkeypatch.setattr(bot, "SHEETS_READ_BUCKET", bucket)
+    assert bot.sheets_call("get", "logs", lambda: "x") == "x"
+    assert b.state == b.CLOSED
+
+
+def test_transient_errors_count_client_errors_do_not(monkeypatch):
+    b = bot.SHEETS_BREAKER
+
+    def boom(exc):
+        def run():
+            raise exc
+        return run
+
+    for _ in range(b.threshold - 1):
+        with pytest.raises(ConnectionError):
+            bot.sheets_call("get", "logs", boom(ConnectionError()))
+    with pytest.raises(ValueError):
+        bot.sheets_call("get", "logs", boom(ValueError()))
+    assert b.state == b.CLOSED  # 서버가 응답한 오류는 실패로 세지 않고 초기화
+    for _ in range(b.threshold):
+        with pytest.raises(ConnectionError):
+            bot.sheets_call("get", "logs", boom(ConnectionError()))
+    assert b.state == b.OPEN
+    with pytest.raises(bot.SheetsUnavailable):
+        bot.sheets_call("get", "logs", lambda: "x")
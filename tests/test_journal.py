@@ -0,0 +1,53 @@
+import time
+
+import app as bot
+from conftest import log_rows
+
+TS = "2026-11-02T09:00:00+09:00"
+
+
+def row(date: str, type_="annual", note="") -> list:
+    return [TS, "a@x", "A", type_, note, date, "auto", "a@x"]
+
+
+def wait_drained(journal, timeout=5.0):
+    end = time.monotonic() + timeout
+    while journal._pending and time.monotonic() < end:
+        time.sleep(0.02)
+    assert not journal._pending
+
+
+def test_replay_skips_rows_already_in_sheet(tmp_path, monkeypatch):
+    path = str(tmp_path / "logs_journal.jsonl")
+    # 기간 연차: 같은 timestamp/user로 날짜만 다른 행들
+    a, b, c = row("2026-11-02"), row("2026-11-03"), row("2026-11-04")
+    before = bot.LogJournal(path)
+    for r in (a, b, c):
+        before.record(r)
+    # a, b는 시트에 들어갔지만 done을 쓰기 전에 죽었다
+    bot.get_ws("logs").append_rows([a, b])
+
+    journal = bot.LogJournal(path)
+    monkeypatch.setattr(bot, "LOG_JOURNAL", journal)
+    assert len(journal._pending) == 3
+    journal.replay()
+    wait_drained(journal)
+    assert sorted(r[5] for r in log_rows(bot)) == ["2026-11-02", "2026-11-03", "2026-11-04"]
+
+    # 다시 시작해도 보낼 것이 없다
+    assert bot.LogJournal(path)._pending == {}
+
+
+def test_replay_keeps_identical_rows_not_yet_written(tmp_path, monkeypatch):
+    path = str(tmp_path / "logs_journal.jsonl")
+    am, pm = row("2026-11-05", "halfday", "(오전)"), row("2026-11-05", "halfday", "(오후)")
+    before = bot.LogJournal(path)
+    before.record(am)
+    before.record(pm)
+    bot.get_ws("logs").append_rows([am])
+
+    journal = bot.LogJournal(path)
+    monkeypatch.setattr(bot, "LOG_JOURNAL", journal)
+    journal.replay()
+    wait_drained(journal)
+    assert sorted(r[4] for r in log_rows(bot)) == ["(오전)", "(오후)"]
@@ -0,0 +1,59 @@
+import datetime as dt
+import threading
+
+import pytest
+
+import app as bot
+from conftest import log_rows
+
+
+@pytest.fixture
+def slow_logs(monkeypatch):
+    """logs 쓰기를 느리게 해 동시 요청이 선두의 기록 중에 겹치게 한다."""
+    monkeypatch.setattr(bot.get_ws("logs"), "_latency", 0.2)
+
+
+def future_day() -> str:
+    d = dt.date.today() + dt.timedelta(days=30)
+    while d.weekday() >= 5:
+        d += dt.timedelta(days=1)
+    return d.isoformat()
+
+
+def run_together(*calls) -> list:
+    out = [None] * len(calls)
+    start = threading.Barrier(len(calls))
+
+    def go(i, kwargs):
+        start.wait()
+        try:
+            out[i] = bot.guard_and_append("a@x", "A", "halfday", date_str=ds, **kwargs)
+        except Exception as e:
+            out[i] = e
+
+    ds = future_day()
+    ts = [threading.Thread(target=go, args=(i, kw)) for i, kw in enumerate(calls)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return out
+
+
+def test_am_and_pm_halfdays_are_both_written(slow_logs):
+    out = run_together(dict(note="(오전)", note_tag="am"), dict(note="(오후)", note_tag="pm"))
+    assert out == [None, None]
+    assert sorted(r[4] for r in log_rows(bot, "halfday")) == ["(오전)", "(오후)"]
+
+
+def test_identical_requests_share_one_write(slow_logs):
+    out = run_together(*[dict(note="(오전)", note_tag="am")] * 3)
+    assert out == [None] * 3
+    assert len(log_rows(bot, "halfday")) == 1
+
+
+def test_different_content_on_same_key_is_checked_not_joined(slow_logs):
+    out = run_together(dict(note="(오전)", note_tag="am"), dict(note="(오전) 병원", note_tag="am"))
+    errors = [e for e in out if isinstance(e, RuntimeError)]
+    assert len(errors) == 1 and "오전 반차" in str(errors[0])
+    assert len(log_rows(bot, "halfday")) == 1
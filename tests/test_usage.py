@@ -0,0 +1,90 @@
+import datetime as dt
+import random
+
+import pytest
+
+import app as bot
+
+HOLIDAY = "2026-03-02"
+USERS = [f"u{i}@x" for i in range(12)]
+CASES = [dict(year=2026), dict(year=2025), dict(since=dt.date(2026, 6, 1)),
+         dict(year=2026, since=dt.date(2026, 6, 1)), dict(year=2026, since=dt.date(2025, 6, 1))]
+
+
+def old_logs_usage_since(rows, user_key, since_date=None, year=None):
+    """예전 logs_usage_since: 행마다 연차 1.0, 반차 0.5 (주말/공휴일 제외)."""
+    annual = half = 0.0
+    for r in rows:
+        if r[1].strip().lower() != user_key:
+            continue
+        d = bot.parse_ymd_safe(r[5].strip())
+        if not d or (since_date and d < since_date) or (year and d.year != year):
+            continue
+        if d.weekday() >= 5 or d.isoformat() == HOLIDAY:
+            continue
+        t = r[3].strip().lower()
+        if t == "annual":
+            annual += 1.0
+        elif t == "halfday":
+            half += 0.5
+    return annual, half
+
+
+def gen_rows(n, seed=7) -> list:
+    """guard_and_append가 허용하는 모양: 날짜당 연차 하나, 또는 오전/오후 반차 하나씩."""
+    rnd, leave, rows = random.Random(seed), {}, []  # (user, date) -> 등록된 연차/반차 메모
+    while len(rows) < n:
+        u = rnd.choice(USERS)
+        d = (dt.date(2025, 3, 1) + dt.timedelta(days=rnd.randrange(600))).isoformat()
+        t = rnd.choice(["annual", "halfday", "checkin", "checkout", "off"])
+        note = rnd.choice(["(오전)", "(오후)"]) if t == "halfday" else ""
+        if t in ("annual", "halfday"):
+            got = leave.setdefault((u, d), set())
+            if "annual" in got or note in got or (t == "annual" and got):
+                continue
+            got.add("annual" if t == "annual" else note)
+        rows.append([f"ts{len(rows)}", u.upper() if len(rows) % 5 == 0 else u, "N", t, note, d, "auto", u])
+    return rows
+
+
+@pytest.fixture
+def logs():
+    bot.get_ws("holidays").append_rows([[HOLIDAY, "대체공휴일"]])
+    rows = gen_rows(1500)
+    bot.get_ws("logs").append_rows(rows)
+    return rows
+
+
+@pytest.mark.parametrize("kw", CASES)
+def test_matches_old_loop(logs, kw):
+    snap = bot.take_logs_snapshot()
+    table = bot.usage_table(snap, **kw)
+    for u in USERS:
+        want = old_logs_usage_since(logs, u, since_date=kw.get("since"), year=kw.get("year"))
+        assert bot.usage_of(u, snap=snap, **kw) == want
+        assert table.get(u) == want
+
+
+def test_follows_appended_rows(logs):
+    bot.take_logs_snapshot()
+    more = [["tsx", "u1@x", "N", "annual", "", "2026-12-01", "auto", "u1@x"],
+            ["tsy", "u1@x", "N", "annual", "", "2026-12-05", "auto", "u1@x"]]  # 토요일
+    bot.write_log_rows(more)
+    assert bot.usage_of("u1@x", year=2026) == old_logs_usage_since(logs + more, "u1@x", year=2026)
+
+
+def test_counts_journal_rows_once(logs, tmp_path, monkeypatch):
+    journal = bot.LogJournal(str(tmp_path / "logs_journal.jsonl"))
+    monkeypatch.setattr(bot, "LOG_JOURNAL", journal)
+    bot.take_logs_snapshot()
+    pending = ["tsp", "u2@x", "N", "halfday", "(오전)", "2026-12-02", "auto", "u2@x"]
+    landed = ["tsl", "u2@x", "N", "halfday", "(오후)", "2026-12-03", "auto", "u2@x"]
+    newcomer = ["tsn", "new@x", "N", "annual", "", "2026-12-02", "auto", "new@x"]
+    for r in (pending, landed, newcomer):
+        journal.record(r)
+    bot.write_log_rows([landed])  # 시트/저장소에는 들어갔고 done은 아직
+
+    want = old_logs_usage_since(logs + [pending, landed], "u2@x", year=2026)
+    assert bot.usage_of("u2@x", year=2026) == want
+    assert bot.usage_table(bot.take_logs_snapshot(), year=2026).get("u2@x") == want
+    assert bot.usage_of("new@x", year=2026) == (1.0, 0.0)